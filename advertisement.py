@@ -0,0 +1,42 @@
+"""
+Passive weight capture from BLE advertisements (no GATT connection).
+Scales of the FG2305ULB family are expected to repeat the weight frame in the
+manufacturer-specific data; where it starts in the frame is not verified yet, hence the
+configurable offset. The frame is rebuilt as transmitted (company id, little endian,
+followed by the payload) and the FFB2-shaped weight packet is taken from `offset` onwards,
+so the existing StabilityTracker decodes weight and stability exactly as for FFB2 notifications.
+"""
+import dekodery
+
+ADV_LABEL = 'ADV'
+ADV_MIN_STABLE = 5  # advertisements arrive slower than notifications and are often deduplicated
+
+def manufacturer_frames(adv, company_id=None):
+    """Yields raw manufacturer-specific frames (company id + payload) from bleak AdvertisementData."""
+    for cid, payload in (getattr(adv, 'manufacturer_data', None) or {}).items():
+        if company_id is None or cid == company_id:
+            yield cid.to_bytes(2, 'little') + bytes(payload)
+
+def weight_packet(frame, offset=0):
+    """Returns the FFB2-shaped part of an advertisement frame, or None when it is too short."""
+    packet = bytes(frame[offset:])
+    return packet if len(packet) >= dekodery.FFB2_LAYOUT.size else None
+
+class AdvertisementWeightReader:
+    """
+    Routes the advertisements of any number of scales to one MeasurementSession per address,
+    so a single scan monitors several scales at once (StreamingScanner on_advertisement).
+    `sessions` maps upper-case addresses to sessions and may grow while scanning;
+    other advertisers are ignored.
+    """
+    def __init__(self, sessions, company_id=None):
+        self.sessions = sessions
+        self.company_id = company_id
+
+    def handle_advertisement(self, device, adv):
+        """detection_callback-compatible entry point."""
+        session = self.sessions.get((device.address or '').upper())
+        if session is None:
+            return
+        for frame in manufacturer_frames(adv, self.company_id):
+            session.handle_adv_frame(frame)
@@ -0,0 +1,370 @@
+import configparser
+import io
+import os
+import tempfile
+import threading
+import time
+
+DEFAULT_INI_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config', 'waga.ini')
+CHECK_INTERVAL = 1.0  # seconds between stat() checks of the ini file
+GATT_CACHE_NAME = 'gatt_cache.ini'
+GATT_SECTION = 'USŁUGI'
+DEVICE_SECTION = 'URZADZENIE'  # further scales: [URZADZENIE_2], [URZADZENIE_3], ...
+
+def no_log(message, level="INFO"):
+    """Default `log` callback of the headless modules: discards the message."""
+    pass
+
+def write_ini_atomic(path, parser):
+    """Writes `parser` to a temp file next to `path`, fsyncs it and renames it over `path`."""
+    path = str(path)
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix='.tmp_', suffix='.ini', dir=directory)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            parser.write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+def _read_ini(path):
+    parser = configparser.ConfigParser()
+    parser.read(path, encoding='utf-8')
+    return parser
+
+class AppConfig:
+    """
+    Single cached view of waga.ini.
+    The file is parsed once and re-parsed only when its mtime or size changes (checked
+    at most every `check_interval` seconds), so readers on hot paths do no disk I/O.
+    Subscribers are called as callback(config) after every reload.
+    """
+    def __init__(self, ini_path, check_interval=CHECK_INTERVAL):
+        self.ini_path = str(ini_path)
+        self.check_interval = check_interval
+        self._subscribers = []
+        self._lock = threading.RLock()
+        self._parser = configparser.ConfigParser()
+        self._signature = None
+        self._checked_at = 0.0
+        self._load()
+
+    # --- loading -----------------------------------------------------------
+
+    def _stat_signature(self):
+        try:
+            st = os.stat(self.ini_path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def _load(self):
+        parser = configparser.ConfigParser()
+        signature = self._stat_signature()
+        if signature is not None:
+            parser.read(self.ini_path, encoding='utf-8')
+        self._parser = parser
+        self._signature = signature
+        self._checked_at = time.monotonic()
+
+    def refresh(self, force=False):
+        """Reloads the file if it changed on disk. Returns True when a reload happened."""
+        with self._lock:
+            now = time.monotonic()
+            if not force and now - self._checked_at < self.check_interval:
+                return False
+            self._checked_at = now
+            if not force and self._stat_signature() == self._signature:
+                return False
+            self._load()
+        self._notify()
+        return True
+
+    def reload(self):
+        """Forces a re-read (call after writing the file)."""
+        return self.refresh(force=True)
+
+    def subscribe(self, callback):
+        if callback not in self._subscribers:
+            self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        if callback in self._subscribers:
+            self._subscribers.remove(callback)
+
+    def _notify(self):
+        for callback in list(self._subscribers):
+            try:
+                callback(self)
+            except Exception as e:
+                print(f"Config subscriber error: {e}")
+
+    # --- writing -----------------------------------------------------------
+
+    def update(self, values, remove_sections=()):
+        """
+        Applies {section: {option: value}} on top of the current file and writes it atomically.
+        Nothing is written when the values are already there. Returns True if the file changed.
+        """
+        with self._lock:
+            # Never write back a stale copy: re-read first if the file changed behind our back
+            self.refresh(force=self._stat_signature() != self._signature)
+            parser = self.copy_parser()
+            changed = False
+            for section, options in values.items():
+                if not parser.has_section(section):
+                    parser.add_section(section)
+                    changed = True
+                for option, value in options.items():
+                    value = str(value)
+                    if parser.get(section, option, raw=True, fallback=None) != value:
+                        parser.set(section, option, value)
+                        changed = True
+            for section in remove_sections:
+                changed = parser.remove_section(section) or changed
+            if not changed:
+                return False
+            write_ini_atomic(self.ini_path, parser)
+        self.reload()
+        return True
+
+    @property
+    def gatt_cache_path(self):
+        return os.path.join(os.path.dirname(self.ini_path), GATT_CACHE_NAME)
+
+    def save_gatt_services(self, services):
+        """
+        Stores the GATT service tree ({service uuid: characteristics text}) in the separate
+        gatt_cache.ini, so waga.ini stays small. Skips the write when nothing changed.
+        """
+        parser = configparser.ConfigParser(interpolation=None)
+        parser[GATT_SECTION] = services
+        rendered = io.StringIO()
+        parser.write(rendered)
+        try:
+            with open(self.gatt_cache_path, 'r', encoding='utf-8') as f:
+                if f.read() == rendered.getvalue():
+                    return False
+        except OSError:
+            pass
+        write_ini_atomic(self.gatt_cache_path, parser)
+        return True
+
+    def gatt_services(self):
+        """Returns the cached GATT service tree (falls back to an old [USŁUGI] section in waga.ini)."""
+        cache = _read_ini(self.gatt_cache_path)
+        if cache.has_section(GATT_SECTION):
+            return dict(cache[GATT_SECTION])
+        return self.section(GATT_SECTION)
+
+    # --- generic accessors -------------------------------------------------
+
+    @property
+    def exists(self):
+        self.refresh()
+        return self._signature is not None
+
+    @property
+    def parser(self):
+        """The current ConfigParser. Treat it as read-only; use copy_parser() to modify."""
+        self.refresh()
+        return self._parser
+
+    def copy_parser(self):
+        """Returns an independent ConfigParser with the current contents."""
+        current = self.parser
+        parser = configparser.ConfigParser()
+        parser.read_dict({section: dict(current.items(section, raw=True)) for section in current.sections()})
+        return parser
+
+    def has_section(self, section):
+        return self.parser.has_section(section)
+
+    def has_option(self, section, option):
+        return self.parser.has_option(section, option)
+
+    def get(self, section, option, fallback=''):
+        return self.parser.get(section, option, fallback=fallback)
+
+    def getint(self, section, option, fallback=0):
+        try:
+            return self.parser.getint(section, option, fallback=fallback)
+        except ValueError:
+            return fallback
+
+    def getboolean(self, section, option, fallback=False):
+        try:
+            return self.parser.getboolean(section, option, fallback=fallback)
+        except ValueError:
+            return fallback
+
+    def section(self, section):
+        """Returns a section as a plain dict (empty if missing)."""
+        parser = self.parser
+        return dict(parser[section]) if parser.has_section(section) else {}
+
+    # --- [PROGRAM] ---------------------------------------------------------
+
+    @property
+    def log_file_name(self):
+        return self.get('PROGRAM', 'nazwa_pliku_log', fallback='fitogar_log.txt') or 'fitogar_log.txt'
+
+    @property
+    def app_port(self):
+        return self.getint('PROGRAM', 'port_aplikacji', fallback=0)
+
+    @property
+    def ble_listen_time(self):
+        return self.getint('PROGRAM', 'czas_nasluchu_ble', fallback=60)
+
+    @property
+    def stop_after_packet(self):
+        return self.getboolean('PROGRAM', 'przerwij_po_pakiecie', fallback=False)
+
+    @property
+    def ble_log_format(self):
+        return self.get('PROGRAM', 'format_logu_ble', fallback='text').strip().lower()
+
+    @property
+    def passive_adv(self):
+        """Weight from advertisements instead of a GATT connection."""
+        return self.getboolean('PROGRAM', 'tryb_pasywny_adv', fallback=False)
+
+    @property
+    def adv_offset(self):
+        return self.getint('PROGRAM', 'adv_offset', fallback=0)
+
+    @property
+    def adv_min_stable(self):
+        return self.getint('PROGRAM', 'adv_min_stable', fallback=5)
+
+    @property
+    def adv_composition(self):
+        """In passive mode, connect for FFB3 body composition after the weight is stable."""
+        return self.getboolean('PROGRAM', 'adv_sklad_ciala', fallback=True)
+
+    # --- [GARMIN] ----------------------------------------------------------
+
+    @property
+    def garmin_email(self):
+        return self.get('GARMIN', 'garmin_email')
+
+    @property
+    def garmin_password(self):
+        """Decoded Garmin password, or None when missing or not valid hex."""
+        password_hex = self.get('GARMIN', 'garmin_password_hex')
+        if not password_hex:
+            return None
+        try:
+            return bytes.fromhex(password_hex).decode('utf-8')
+        except (ValueError, UnicodeDecodeError):
+            return None
+
+    @property
+    def send_mode(self):
+        return self.get('GARMIN', 'tryb_wysylki', fallback='gc').lower()
+
+    @property
+    def api_token(self):
+        return self.get('GARMIN', 'api_token')
+
+    @property
+    def api_url(self):
+        return self.get('GARMIN', 'api_url')
+
+    @property
+    def api_batch(self):
+        return self.getboolean('GARMIN', 'api_tryb_batch', fallback=False)
+
+    # --- [URZADZENIE] ------------------------------------------------------
+
+    @property
+    def device(self):
+        return self.section('URZADZENIE')
+
+    @property
+    def mac_address(self):
+        return self.get('URZADZENIE', 'mac_address')
+
+    @property
+    def devices(self):
+        """Every configured scale ([URZADZENIE], [URZADZENIE_2], ...) with a MAC, as dicts with a 'section' key."""
+        parser = self.parser
+        devices = []
+        for section in parser.sections():
+            if section == DEVICE_SECTION or section.startswith(DEVICE_SECTION + '_'):
+                device = dict(parser[section])
+                if device.get('mac_address'):
+                    device['section'] = section
+                    devices.append(device)
+        return devices
+
+    def device_section_for(self, mac):
+        """Section that already holds `mac`, otherwise the primary [URZADZENIE]."""
+        return self._section_holding(mac) or DEVICE_SECTION
+
+    def add_device(self, info, remove_sections=()):
+        """
+        Registers a scale (dict with 'mac_address') next to the configured ones and returns its section:
+        the one that already holds its MAC, [URZADZENIE] while that has no MAC, otherwise the next
+        free [URZADZENIE_<n>].
+        """
+        with self._lock:
+            self.refresh(force=True)
+            section = self._section_holding(info.get('mac_address'))
+            if section is None and not self.mac_address:
+                section = DEVICE_SECTION
+            if section is None:
+                n = 2
+                while self.has_section(f"{DEVICE_SECTION}_{n}"):
+                    n += 1
+                section = f"{DEVICE_SECTION}_{n}"
+            self.update({section: info}, remove_sections=remove_sections)
+        return section
+
+    def _section_holding(self, mac):
+        for device in self.devices:
+            if device['mac_address'].upper() == (mac or '').upper():
+                return device['section']
+        return None
+
+_configs = {}
+_configs_lock = threading.Lock()
+
+def get_config(ini_path=None):
+    """Returns the shared AppConfig for `ini_path` (default: config/waga.ini next to the app)."""
+    key = os.path.abspath(str(ini_path or DEFAULT_INI_PATH))
+    with _configs_lock:
+        config = _configs.get(key)
+        if config is None:
+            config = _configs[key] = AppConfig(key)
+        return config
+
+def data_path(ini_path, name):
+    """Path of the data file `name` of the app that owns `ini_path` (config/ and data/ are siblings)."""
+    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(str(ini_path))))
+    return os.path.join(base_dir, 'data', name)
+
+_shared = {}
+_shared_lock = threading.Lock()
+
+def shared_data_object(ini_path, name, factory):
+    """One object per data file: factory(path) on first use, the same object afterwards."""
+    path = data_path(ini_path, name)
+    with _shared_lock:
+        obj = _shared.get(path)
+        if obj is None:
+            obj = _shared[path] = factory(path)
+        return obj
+
+def shared_data_objects(name):
+    """Every object created by shared_data_object() for a data file called `name`."""
+    with _shared_lock:
+        return [obj for path, obj in _shared.items() if os.path.basename(path) == name]
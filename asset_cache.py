@@ -0,0 +1,171 @@
+"""
+Shared image cache for all screens.
+Images under assets/images are listed once (manifest) instead of an exists() check per widget.
+Each image is uploaded to the GPU once and shared by every screen; backgrounds are downscaled
+to the window size first (tlo3a.png alone is ~2.5 MB of PNG, far more pixels than a phone screen shows).
+With Pillow, decoding and scaling run in a background thread (preload) and only the upload needs
+the main thread; without it (Kivy-only builds) the image is drawn once into an Fbo of the target size.
+"""
+import os
+import threading
+from pathlib import Path
+
+try:
+    from PIL import Image as PILImage
+except ImportError:  # scaled with a Kivy Fbo instead, on the main thread
+    PILImage = None
+
+BASE_DIR = Path(__file__).parent
+IMAGES_DIR = BASE_DIR / 'assets' / 'images'
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+BACKGROUNDS = ('tlo4.png', 'tlo3.png', 'tlo3a.png')
+SIZE_STEP = 64  # window sizes are rounded up to this, so small resizes reuse the cached texture
+
+_manifest = None
+_textures = {}  # name -> (size key, Texture)
+_decoded = {}   # name -> (size key, (pixel size, rgba bytes)) decoded by preload(), waiting for upload
+_lock = threading.Lock()
+
+def manifest():
+    """{file name: path} of every image in assets/images, read with a single directory scan."""
+    global _manifest
+    if _manifest is None:
+        try:
+            with os.scandir(IMAGES_DIR) as entries:
+                _manifest = {e.name: e.path for e in entries
+                             if e.is_file() and e.name.lower().endswith(IMAGE_EXTENSIONS)}
+        except OSError as e:
+            print(f"Cannot list {IMAGES_DIR}: {e}")
+            _manifest = {}
+    return _manifest
+
+def image_path(name):
+    """Path of an image from the manifest, None when the file is not shipped."""
+    return manifest().get(name)
+
+def window_size_key():
+    from kivy.core.window import Window
+    width, height = Window.size
+    return (-(-int(width) // SIZE_STEP) * SIZE_STEP, -(-int(height) // SIZE_STEP) * SIZE_STEP)
+
+def _decode(path, max_size=None):
+    """Decodes (and downscales to max_size) an image to RGBA bytes; safe outside the main thread."""
+    with PILImage.open(path) as img:
+        img = img.convert('RGBA')
+        if max_size and (img.width > max_size[0] or img.height > max_size[1]):
+            # Backgrounds are stretched over the window anyway, so each axis is scaled on its own
+            img = img.resize((min(img.width, max_size[0]), min(img.height, max_size[1])), PILImage.LANCZOS)
+        return img.size, img.tobytes()
+
+def _render_scaled(path, max_size):
+    """
+    Pillow-free scaling (main thread): draws the image once into an Fbo of the target size and
+    reads the pixels back (bottom row first). The full-size texture is released afterwards.
+    """
+    from kivy.core.image import Image as CoreImage
+    from kivy.graphics import Fbo, Rectangle, ClearColor, ClearBuffers
+    source = CoreImage(path, nocache=True).texture
+    size = (min(source.width, max_size[0]), min(source.height, max_size[1])) if max_size else source.size
+    fbo = Fbo(size=size)
+    with fbo:
+        ClearColor(0, 0, 0, 0)
+        ClearBuffers()
+        Rectangle(texture=source, pos=(0, 0), size=size)
+    fbo.draw()
+    return size, fbo.pixels
+
+def _load_pixels(path, max_size):
+    """(pixel size, rgba bytes) and whether the rows are top-down (Pillow) and need flipping."""
+    if PILImage is not None:
+        return _decode(path, max_size), True
+    return _render_scaled(path, max_size), False
+
+def _upload(decoded, flip, path, max_size):
+    from kivy.graphics.texture import Texture
+    size, pixels = decoded
+    texture = Texture.create(size=size, colorfmt='rgba')
+    texture.blit_buffer(pixels, colorfmt='rgba', bufferfmt='ubyte')
+    if flip:
+        texture.flip_vertical()
+
+    def reload(tex):
+        # Textures filled from a buffer are blank after a GL context loss (Android pause/resume)
+        tex.blit_buffer(_load_pixels(path, max_size)[0][1], colorfmt='rgba', bufferfmt='ubyte')
+    texture.add_reload_observer(reload)
+    return texture
+
+def texture(name, fit_window=False):
+    """
+    Shared texture of an image (main thread). With fit_window the image is scaled down to the window size.
+    Returns None when the image is not in the manifest or cannot be loaded.
+    """
+    path = image_path(name)
+    if path is None:
+        return None
+    key = window_size_key() if fit_window else None
+    with _lock:
+        pending = _decoded.pop(name, None)
+    cached = _textures.get(name)
+    if cached and cached[0] == key:
+        return cached[1]
+    try:
+        if pending and pending[0] == key:
+            tex = _upload(pending[1], True, path, key)
+        elif key is None and PILImage is None:
+            from kivy.core.image import Image as CoreImage
+            tex = CoreImage(path).texture  # icons: full size, Kivy reloads these itself
+        else:
+            tex = _upload(*_load_pixels(path, key), path, key)
+    except Exception as e:
+        print(f"Cannot load image {name}: {e}")
+        return None
+    # Replacing the old entry frees the texture made for a previous window size
+    _textures[name] = (key, tex)
+    return tex
+
+def background(name):
+    """Background texture scaled to the window, shared by all screens using the same file."""
+    return texture(name, fit_window=True)
+
+def preload(names=BACKGROUNDS, fit_window=True):
+    """
+    Decodes images in a background thread and uploads them on the following frames, so a
+    screen shown later finds its texture ready. Without Pillow the images are scaled on
+    the main thread instead, one per frame.
+    """
+    from kivy.clock import Clock
+    key = window_size_key() if fit_window else None
+    todo = [name for name in names if image_path(name) and (_textures.get(name) or (None,))[0] != key]
+    if PILImage is None:
+        def scale_next(dt):
+            if todo:
+                texture(todo.pop(0), fit_window=fit_window)
+                Clock.schedule_once(scale_next, 0)
+        Clock.schedule_once(scale_next, 0)
+        return
+
+    def upload_next(dt):
+        # One texture per frame keeps the UI responsive
+        with _lock:
+            name = next(iter(_decoded), None)
+        if name is not None:
+            texture(name, fit_window=fit_window)
+            Clock.schedule_once(upload_next, 0)
+
+    def worker():
+        for name in todo:
+            try:
+                decoded = _decode(image_path(name), key)
+            except Exception as e:
+                print(f"Cannot preload image {name}: {e}")
+                continue
+            with _lock:
+                _decoded[name] = (key, decoded)
+        Clock.schedule_once(upload_next, 0)
+
+    if todo:
+        threading.Thread(target=worker, name="asset-preload", daemon=True).start()
+
+def stats():
+    """(textures held, approximate GPU bytes) for logging."""
+    return len(_textures), sum(tex.width * tex.height * 4 for key, tex in _textures.values())
@@ -0,0 +1,202 @@
+"""
+Micro-benchmarks of the BLE callback path: FFB2 stability/weight decoding,
+FFB3 body analysis decoding and the logging path.
+Runs headless (no Kivy, no Bluetooth) over the shipped ble_*.log captures and
+synthetic long sessions, and stores results as JSON for comparison across commits.
+
+    python benchmark.py --json bench.json
+    python benchmark.py --json bench_new.json --compare bench.json
+"""
+import argparse
+import datetime
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import dekodery
+from measurement import MeasurementSession, MIN_STABLE_COUNT
+from packet_capture import read_capture
+
+BASE_DIR = Path(__file__).parent
+CAPTURE_GLOBS = ["src/app/data/log/ble_*.log", "data/log/ble_*.log"]
+SYNTHETIC_SIZES = (1000, 10000, 100000)
+
+def load_captures():
+    """Returns (ffb2_packets, ffb3_packets) collected from the shipped captures."""
+    ffb2, ffb3 = [], []
+    for pattern in CAPTURE_GLOBS:
+        for path in sorted(BASE_DIR.glob(pattern)):
+            for ts, label, data in read_capture(path):
+                if label == 'FFB2':
+                    ffb2.append(data)
+                elif label == 'FFB3':
+                    ffb3.append(data)
+    return ffb2, ffb3
+
+def synthetic_session(size, seed_packets):
+    """A long step-on session: fluctuating weight, then a long stable run."""
+    fluctuating = seed_packets or [bytes.fromhex('b0000700a20125617e08000f')]
+    stable = bytearray(fluctuating[-1])
+    packets = []
+    for i in range(size):
+        if i < size // 4:
+            pkt = bytearray(fluctuating[i % len(fluctuating)])
+        else:
+            pkt = bytearray(stable)
+        pkt[0] = i & 0xFF
+        packets.append(bytes(pkt))
+    return packets
+
+def percentiles(samples_ns):
+    ordered = sorted(samples_ns)
+    n = len(ordered)
+    def pick(q):
+        return ordered[min(n - 1, int(q * n))] / 1000.0
+    return {'p50_us': pick(0.50), 'p90_us': pick(0.90), 'p99_us': pick(0.99), 'max_us': ordered[-1] / 1000.0}
+
+def _snapshot():
+    return tracemalloc.take_snapshot().filter_traces((tracemalloc.Filter(False, tracemalloc.__file__),))
+
+def measure(name, make_func, items, settle=None):
+    """
+    Times func(item) per item, then runs a fresh func = make_func() over the same items under
+    tracemalloc, so the memory pass does not continue the state of the timed pass.
+    Allocated bytes/blocks per item are the snapshot difference over the run (allocations
+    still alive at its end); `settle()` runs before the closing snapshot (e.g. to flush a
+    background writer).
+    """
+    timer = time.perf_counter_ns
+    func = make_func()
+    samples = []
+    started = timer()
+    for item in items:
+        t0 = timer()
+        func(item)
+        samples.append(timer() - t0)
+    total_s = (timer() - started) / 1e9
+    if settle:
+        settle()
+
+    func = make_func()
+    tracemalloc.start()
+    before = _snapshot()
+    baseline, _ = tracemalloc.get_traced_memory()
+    for item in items:
+        func(item)
+    if settle:
+        settle()
+    _, peak = tracemalloc.get_traced_memory()
+    diff = _snapshot().compare_to(before, 'filename')
+    tracemalloc.stop()
+
+    n = len(items) or 1
+    result = {
+        'name': name,
+        'packets': len(items),
+        'total_s': total_s,
+        'packets_per_s': len(items) / total_s if total_s else 0.0,
+        'alloc_peak_bytes': peak - baseline,
+        'alloc_bytes_per_packet': sum(stat.size_diff for stat in diff) / n,
+        'alloc_blocks_per_packet': sum(stat.count_diff for stat in diff) / n,
+    }
+    result.update(percentiles(samples))
+    return result
+
+def bench_ffb2(name, packets):
+    """
+    The FFB2 notification path of a MeasurementSession (packet ring + stability tracker).
+    Goes through _push_weight_packet so decoding continues after the weight is stable.
+    """
+    return measure(name, lambda: MeasurementSession(MIN_STABLE_COUNT)._push_weight_packet, packets)
+
+def bench_ffb3(name, packets):
+    return measure(name, lambda: dekodery.dekoduj_ffb3_bytes, packets)
+
+def bench_logging(name, count, tmp_dir):
+    lines = [f"[FFB2] Packet received: {i:024x}" for i in range(count)]
+    flush_times = []
+    runs = []
+
+    def make_run():
+        # Every pass logs into its own app directory, so each log gets exactly `count` lines
+        ini_path = Path(tmp_dir) / f"run{len(runs)}" / 'config' / 'waga.ini'
+        ini_path.parent.mkdir(parents=True, exist_ok=True)
+        ini_path.write_text("[PROGRAM]\nnazwa_pliku_log = bench_log.txt\n", encoding='utf-8')
+        runs.append(str(ini_path))
+        return lambda msg: dekodery.loguj(msg, dopisek="bench", ini_path=str(ini_path))
+
+    def flush():
+        t0 = time.perf_counter()
+        dekodery.flush_logs()
+        flush_times.append(time.perf_counter() - t0)
+
+    result = measure(name, make_run, lines, settle=flush)
+    result['flush_s'] = flush_times[0]
+    for ini_path in runs:
+        dekodery.invalidate_log_path(ini_path)
+    return result
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_DIR,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+def run_all(sizes=SYNTHETIC_SIZES):
+    ffb2, ffb3 = load_captures()
+    results = []
+    if ffb2:
+        results.append(bench_ffb2(f"ffb2_capture_{len(ffb2)}", ffb2))
+    for size in sizes:
+        results.append(bench_ffb2(f"ffb2_synthetic_{size}", synthetic_session(size, ffb2)))
+    if ffb3:
+        results.append(bench_ffb3("ffb3_capture_x1000", ffb3 * (1000 // len(ffb3) + 1)))
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        results.append(bench_logging("loguj_10000", 10000, tmp_dir))
+    return {
+        'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+        'revision': git_revision(),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'results': results,
+    }
+
+def print_report(report, previous=None):
+    before = {r['name']: r for r in (previous or {}).get('results', [])}
+    print(f"Revision {report['revision']} | Python {report['python']} | {report['platform']}")
+    for r in report['results']:
+        line = (f"{r['name']:<26} {r['packets']:>7} pkts  p50 {r['p50_us']:7.2f} us  p99 {r['p99_us']:7.2f} us  "
+                f"{r['packets_per_s']:>10.0f} pkt/s  peak {r['alloc_peak_bytes']:>8} B  "
+                f"{r['alloc_bytes_per_packet']:7.1f} B {r['alloc_blocks_per_packet']:5.2f} blk/pkt")
+        old = before.get(r['name'])
+        if old and old.get('p50_us'):
+            line += f"  p50 {100.0 * (r['p50_us'] - old['p50_us']) / old['p50_us']:+.1f}%"
+        print(line)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the FiToGar decoders and logging path.")
+    parser.add_argument('--json', help="write results to this JSON file")
+    parser.add_argument('--compare', help="previous JSON results to compare against")
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(SYNTHETIC_SIZES),
+                        help="synthetic session lengths in packets")
+    args = parser.parse_args(argv)
+
+    report = run_all(args.sizes)
+    previous = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            previous = json.load(f)
+    print_report(report, previous)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
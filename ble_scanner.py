@@ -0,0 +1,153 @@
+import asyncio
+
+FFB0_SERVICE_UUID = "0000ffb0-0000-1000-8000-00805f9b34fb"
+SCAN_TIMEOUT = 15.0
+
+class DeviceMatcher:
+    """
+    Matches an advertisement against a stored MAC, a name fragment and/or a service UUID.
+    Every given criterion has to match; with no criteria nothing matches.
+    """
+    def __init__(self, mac=None, name=None, service_uuid=None):
+        self.mac = mac.upper() if mac else None
+        self.name = name.lower() if name else None
+        self.service_uuid = service_uuid.lower() if service_uuid else None
+
+    def __bool__(self):
+        return bool(self.mac or self.name or self.service_uuid)
+
+    def __call__(self, device, adv=None):
+        if not self:
+            return False
+        if self.mac and (device.address or '').upper() != self.mac:
+            return False
+        if self.name:
+            name = device.name or getattr(adv, 'local_name', None) or ''
+            if self.name not in name.lower():
+                return False
+        if self.service_uuid:
+            uuids = [u.lower() for u in (getattr(adv, 'service_uuids', None) or [])]
+            if self.service_uuid not in uuids:
+                return False
+        return True
+
+class StreamingScanner:
+    """
+    BLE scan driven by detection callbacks instead of a blocking discover().
+    Devices are deduplicated by address; repeated advertisements only update the RSSI.
+    on_device(device, rssi, is_new) is called for every advertisement, so the UI can add
+    devices as they appear; on_advertisement(device, adv) gets the raw advertisement data.
+    With a `match`, run() returns as soon as a matching device is seen; finish() ends it early too.
+    `scanner_factory` is bleak's BleakScanner by default; tests can pass a fake.
+    """
+    def __init__(self, on_device=None, match=None, scanner_factory=None, on_advertisement=None):
+        self.on_device = on_device
+        self.on_advertisement = on_advertisement
+        self.match = match
+        self.scanner_factory = scanner_factory
+        self.devices = {}   # address -> device
+        self.rssi = {}      # address -> last RSSI
+        self.matched = None
+        self.stop_on_match = True
+        self._found = asyncio.Event()
+
+    def handle_advertisement(self, device, adv):
+        address = (device.address or '').upper()
+        if not address:
+            return
+        rssi = getattr(adv, 'rssi', None)
+        if rssi is None:
+            rssi = getattr(device, 'rssi', None)
+        is_new = address not in self.devices
+        self.devices[address] = device
+        self.rssi[address] = rssi
+        if self.on_device:
+            self.on_device(device, rssi, is_new)
+        if self.on_advertisement:
+            self.on_advertisement(device, adv)
+        if self.matched is None and self.match and self.match(device, adv):
+            self.matched = device
+            if self.stop_on_match:
+                self._found.set()
+
+    def finish(self):
+        """Stops a running scan before its timeout."""
+        self._found.set()
+
+    async def run(self, timeout=SCAN_TIMEOUT, stop_on_match=True):
+        """Scans until a match (if requested), finish() or `timeout`. Returns the matched device or None."""
+        self.stop_on_match = stop_on_match
+        factory = self.scanner_factory
+        if factory is None:
+            from bleak import BleakScanner
+            factory = BleakScanner
+        scanner = factory(detection_callback=self.handle_advertisement)
+        await scanner.start()
+        try:
+            await asyncio.wait_for(self._found.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            await scanner.stop()
+        return self.matched
+
+    def sorted_devices(self):
+        """Devices ordered by signal strength (strongest first)."""
+        return sorted(self.devices.values(),
+                      key=lambda d: -(self.rssi.get(d.address.upper()) or -999))
+
+async def find_device(mac=None, name=None, service_uuid=None, timeout=10.0, scanner_factory=None):
+    """Short pre-scan for one device; returns its BLEDevice or None when it did not advertise in time."""
+    scanner = StreamingScanner(match=DeviceMatcher(mac, name, service_uuid), scanner_factory=scanner_factory)
+    return await scanner.run(timeout)
+
+class ScanResults:
+    """
+    Scan results for the device list: one entry per address, updated in place as advertisements arrive.
+    visible() applies the name/MAC filter and the FFB0-only filter and sorts by RSSI (strongest first) or name.
+    """
+    SORT_KEYS = ('rssi', 'name')
+
+    def __init__(self):
+        self.entries = {}  # address -> {'device', 'address', 'name', 'rssi', 'ffb0'}
+        self.sort_by = 'rssi'
+        self.text_filter = ''
+        self.ffb0_only = False
+
+    def __len__(self):
+        return len(self.entries)
+
+    def clear(self):
+        self.entries.clear()
+
+    def update(self, device, rssi=None, service_uuids=None):
+        """Adds or refreshes a device; returns True when something shown in its row changed."""
+        address = (device.address or '').upper()
+        entry = self.entries.get(address)
+        if entry is None:
+            entry = self.entries[address] = {'device': device, 'address': device.address, 'name': None,
+                                             'rssi': None, 'ffb0': False}
+        before = (entry['name'], entry['rssi'], entry['ffb0'])
+        entry['device'] = device
+        entry['name'] = device.name or entry['name']
+        if rssi is not None:
+            entry['rssi'] = rssi
+        if service_uuids and FFB0_SERVICE_UUID in (u.lower() for u in service_uuids):
+            entry['ffb0'] = True
+        return before != (entry['name'], entry['rssi'], entry['ffb0'])
+
+    def next_sort(self):
+        """Switches to the next sort key and returns it."""
+        self.sort_by = self.SORT_KEYS[(self.SORT_KEYS.index(self.sort_by) + 1) % len(self.SORT_KEYS)]
+        return self.sort_by
+
+    def visible(self):
+        text = self.text_filter.strip().lower()
+        entries = [e for e in self.entries.values()
+                   if (not self.ffb0_only or e['ffb0'])
+                   and (not text or text in (e['name'] or '').lower() or text in e['address'].lower())]
+        if self.sort_by == 'name':
+            entries.sort(key=lambda e: (e['name'] is None, (e['name'] or '').lower(), e['address']))
+        else:
+            entries.sort(key=lambda e: (-(e['rssi'] if e['rssi'] is not None else -999), e['address']))
+        return entries
@@ -0,0 +1,244 @@
+"""
+Import audit for the cx_Freeze build.
+Records which modules a scripted start -> weigh -> upload run really imports (through
+`python -X importtime`), writes build_profile.json for setup.py and prints import time
+and on-disk size per top-level package. Nothing is written when a required package
+(REQUIRED_PACKAGES) was not imported, e.g. because it is not installed on this machine.
+
+    python build_profile.py                         # scripted headless run
+    python build_profile.py --capture ble_xxx.log   # weigh step replays this capture
+    python -X importtime main.py 2> gui_imports.txt
+    python build_profile.py --importtime gui_imports.txt   # profile a real GUI session instead
+"""
+import argparse
+import importlib
+import importlib.util
+import json
+import os
+import shutil
+import subprocess
+import sys
+import sysconfig
+import tempfile
+from pathlib import Path
+
+BASE_DIR = Path(__file__).parent
+PROFILE_PATH = BASE_DIR / "build_profile.json"
+DEFAULT_CAPTURE = BASE_DIR / "src" / "app" / "data" / "log" / "ble_c57530bb360e_20250703_130826.log"
+STDLIB_DIR = os.path.normcase(os.path.abspath(sysconfig.get_paths()['stdlib']))
+# Without these the profile describes an app that cannot run; no profile is written then
+REQUIRED_PACKAGES = ('kivy', 'bleak', 'requests', 'garminconnect')
+# Imported only by the scripted run itself (SimulatedClient), never by the app
+SCENARIO_ONLY = {'scale_manager'}
+
+# --- scripted run (executed in a child process under -X importtime) ------------------
+
+def _scenario(capture):
+    """
+    start -> weigh -> upload, without a display, Bluetooth or network.
+    Uses __import__: importlib.import_module() bypasses the -X importtime hook.
+    """
+    import asyncio
+
+    # start: the app and every screen module (needs Kivy; skipped with a warning without it)
+    try:
+        import main
+        for module, _ in main.SCREENS.values():
+            __import__(module)
+    except Exception as e:
+        print(f"WARNING: screens not imported ({e}); the GUI packages are missing from the profile.", file=sys.stderr)
+
+    # weigh: the real MeasurementService replaying a capture through a simulated client
+    import measurement_service
+    from scale_manager import SimulatedClient
+    from packet_capture import read_capture
+    try:
+        __import__('bleak')  # imported by the app when it scans/connects
+    except ImportError as e:
+        print(f"WARNING: {e}", file=sys.stderr)
+    packets = [(label, data) for ts, label, data in read_capture(capture)]
+
+    async def not_found(**kwargs):
+        return None
+    measurement_service.find_device = not_found
+
+    work_dir = Path(tempfile.mkdtemp(prefix="fitogar_profile_"))
+    try:
+        (work_dir / "config").mkdir()
+        shutil.copy(BASE_DIR / "config" / "waga.ini", work_dir / "config" / "waga.ini")
+
+        def client_factory(target, **kwargs):
+            client = SimulatedClient(packets, interval=0, disconnected_callback=kwargs.get('disconnected_callback'))
+            client.services = []  # the service saves the (empty) GATT layout into the temporary profile cache
+            return client
+
+        service = measurement_service.MeasurementService(
+            work_dir / "config" / "waga.ini", log=lambda message, level="INFO": None,
+            client_factory=client_factory, log_dir=work_dir / "log")
+        # Disconnect right after the result instead of waiting for the scale to sleep
+        service.config.update({'PROGRAM': {'przerwij_po_pakiecie': 'true'}})
+        if service.prepare():
+            service.session.require_composition = False  # the bundled capture has too few FFB3 packets
+            asyncio.run(asyncio.wait_for(service.measure(), 10))
+            if service.session.stable_weight is None:
+                print(f"WARNING: weigh step ended without a stable weight ({service.end_status})", file=sys.stderr)
+    except Exception as e:
+        print(f"WARNING: weigh step failed ({e})", file=sys.stderr)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    # upload: the lazily imported network stack (no request is sent)
+    import dekodery
+    import upload_queue
+    try:
+        dekodery.get_http_session()
+        __import__('garminconnect')
+        __import__('garmin_session')
+    except ImportError as e:
+        print(f"WARNING: {e}", file=sys.stderr)
+    dekodery.flush_logs()
+    # -X importtime also reports imports that failed (optional accelerators, Windows-only modules)
+    print(json.dumps(sorted(sys.modules)))
+
+def run_scenario(capture):
+    """Runs the scripted session in a child interpreter; returns its -X importtime output and the loaded modules."""
+    env = dict(os.environ, KIVY_NO_ARGS='1', KIVY_NO_CONSOLELOG='1')
+    proc = subprocess.run([sys.executable, '-X', 'importtime', str(Path(__file__).resolve()), '--scenario', str(capture)],
+                          cwd=BASE_DIR, env=env, capture_output=True, text=True)
+    warnings = [line for line in proc.stderr.splitlines() if not line.startswith('import time:')]
+    for line in warnings:
+        print(line)
+    try:
+        loaded = set(json.loads(proc.stdout.strip().splitlines()[-1]))
+    except (IndexError, ValueError):
+        loaded = None
+    return proc.stderr, loaded
+
+# --- analysis ----------------------------------------------------------------------
+
+def parse_importtime(text, loaded=None):
+    """Parses -X importtime output into {module: (self_us, cumulative_us)}, optionally only modules in `loaded`."""
+    modules = {}
+    for line in text.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        parts = line[len('import time:'):].split('|')
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue
+        name = parts[2].strip()
+        if loaded is not None and name not in loaded:
+            continue
+        modules[name] = (int(parts[0]), int(parts[1]))
+    return modules
+
+def classify(top):
+    """Returns ('app' | 'stdlib' | 'third-party' | None when not installed, path or None) for a top-level module."""
+    if top in sys.builtin_module_names:
+        return 'stdlib', None
+    try:
+        spec = importlib.util.find_spec(top)
+    except (ImportError, ValueError):
+        spec = None
+    if spec is None:
+        return None, None
+    if spec.submodule_search_locations:
+        path = list(spec.submodule_search_locations)[0]
+    elif spec.origin and spec.origin not in ('built-in', 'frozen'):
+        path = spec.origin
+    else:
+        return 'stdlib', None
+    norm = os.path.normcase(os.path.abspath(path))
+    if norm.startswith(os.path.normcase(str(BASE_DIR.resolve()))):
+        return 'app', path
+    if 'site-packages' in norm or 'dist-packages' in norm or not norm.startswith(STDLIB_DIR):
+        return 'third-party', path
+    return 'stdlib', path
+
+def disk_usage(path):
+    """Bytes on disk and whether there is anything besides .py/.pyc (extensions, data files)."""
+    if path is None:
+        return 0, False
+    if os.path.isfile(path):
+        return os.path.getsize(path), not path.endswith('.py')
+    total, has_binary = 0, False
+    for root, dirs, files in os.walk(path):
+        dirs[:] = [d for d in dirs if d != '__pycache__']
+        for name in files:
+            total += os.path.getsize(os.path.join(root, name))
+            if not name.endswith(('.py', '.pyc')):
+                has_binary = True
+    return total, has_binary
+
+def build_profile(importtime_text, loaded=None):
+    modules = parse_importtime(importtime_text, loaded)
+    packages = {}
+    for name, (self_us, _) in modules.items():
+        top = name.split('.')[0]
+        entry = packages.setdefault(top, {'modules': 0, 'import_us': 0})
+        entry['modules'] += 1
+        entry['import_us'] += self_us
+    for top in list(packages):
+        kind, path = classify(top)
+        if kind is None:  # failed import attempt in an --importtime log
+            del packages[top]
+            continue
+        size, has_binary = disk_usage(path)
+        packages[top].update(kind=kind, size=size, binary=has_binary)
+    modules = {name: times for name, times in modules.items() if name.split('.')[0] in packages}
+
+    third_party = sorted(top for top, e in packages.items() if e['kind'] == 'third-party' and not top.startswith('_'))
+    return {
+        'modules': sorted(modules),
+        'packages': packages,
+        # setup.py: whole packages only for third-party code; stdlib is found by cx_Freeze itself
+        'build_packages': third_party,
+        'includes': sorted(top for top, e in packages.items()
+                           if e['kind'] == 'app' and top != '__main__' and top not in SCENARIO_ONLY),
+        'zip_exclude_packages': sorted(top for top in third_party if packages[top]['binary']),
+    }
+
+def print_report(profile):
+    rows = sorted(profile['packages'].items(), key=lambda item: -item[1]['import_us'])
+    print(f"{'package':28} {'kind':12} {'modules':>7} {'import ms':>10} {'size KB':>10}")
+    for top, e in rows:
+        print(f"{top:28} {e['kind']:12} {e['modules']:7d} {e['import_us'] / 1000:10.1f} {e['size'] / 1024:10.0f}")
+    for kind in ('app', 'third-party', 'stdlib'):
+        chosen = [e for e in profile['packages'].values() if e['kind'] == kind]
+        print(f"{kind:12} {len(chosen):4d} packages, {sum(e['import_us'] for e in chosen) / 1000:8.1f} ms, "
+              f"{sum(e['size'] for e in chosen) / 1024 / 1024:7.1f} MB")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Record imported modules and write build_profile.json for setup.py.")
+    parser.add_argument('--capture', default=str(DEFAULT_CAPTURE), help="BLE capture replayed in the weigh step")
+    parser.add_argument('--importtime', metavar='FILE', help="use an existing `python -X importtime main.py` log")
+    parser.add_argument('--output', default=str(PROFILE_PATH))
+    parser.add_argument('--scenario', metavar='CAPTURE', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.scenario:
+        _scenario(args.scenario)
+        return 0
+
+    loaded = None
+    if args.importtime:
+        with open(args.importtime, 'r', encoding='utf-8', errors='replace') as f:
+            text = f.read()
+    else:
+        text, loaded = run_scenario(args.capture)
+    profile = build_profile(text, loaded)
+    if not profile['modules']:
+        print("No imports recorded.")
+        return 1
+    missing = [name for name in REQUIRED_PACKAGES if name not in profile['packages']]
+    if missing:
+        print(f"ERROR: {', '.join(missing)} not imported; install them and run again. {args.output} not written.")
+        return 1
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(profile, f, indent=1)
+    print_report(profile)
+    print(f"\nbuild packages: {profile['build_packages']}")
+    print(f"Profile written to {args.output}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
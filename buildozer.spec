@@ -7,7 +7,7 @@ package.domain = org.example
 source.dir = .
 source.include_exts = py,png,jpg,kv,ini,txt,md,ttf,otf,ico
 version = 1.0.0
-requirements = python3,kivy,cython,bleak
+requirements = python3,kivy,cython,bleak,sqlite3,pillow
 orientation = portrait
 fullscreen = 1
 android.permissions = INTERNET,BLUETOOTH,BLUETOOTH_ADMIN,BLUETOOTH_CONNECT,BLUETOOTH_SCAN,WRITE_EXTERNAL_STORAGE,READ_EXTERNAL_STORAGE
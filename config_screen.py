@@ -1,5 +1,4 @@
 import os
-import configparser
 from pathlib import Path
 from kivy.uix.screenmanager import Screen
 from kivy.uix.boxlayout import BoxLayout
@@ -16,7 +15,9 @@ from kivy.uix.switch import Switch  # Dodaj import dla Switch
 
 try:
     from dekodery import validate_ini_config
+    from app_config import get_config
     from ui_components import InfoCard, SectionTitle
+    import asset_cache
 except ImportError as e:
     print(f"CRITICAL ERROR in config_screen.py: {e}. Make sure that 'dekodery.py' and 'ui_components.py' files exist.")
     exit()
@@ -30,10 +31,8 @@ class ConfigScreen(Screen):
         super().__init__(**kwargs)
         # Initialize dictionary for TextInput controls
         self.inputs = {}
-        # Initialize configparser parser
-        self.parser = configparser.ConfigParser()
         root_layout = RelativeLayout()
-        root_layout.add_widget(Image(source=str(BASE_DIR / 'assets' / 'images' / 'tlo3.png'), allow_stretch=True, keep_ratio=False))
+        root_layout.add_widget(Image(texture=asset_cache.background('tlo3.png'), allow_stretch=True, keep_ratio=False))
         # Main container
         main_box = BoxLayout(orientation='vertical', padding=10, spacing=10)
         # Screen title
@@ -130,12 +129,12 @@ class ConfigScreen(Screen):
         return grid
 
     def load_data(self):
-        if not INI_PATH.exists():
+        config = get_config(INI_PATH)
+        if not config.exists:
             return
-        self.parser.read(INI_PATH, encoding='utf-8')
         for key, input_widget in self.inputs.items():
             section, option = key.split('.')
-            value = self.parser.get(section, option, fallback='')
+            value = config.get(section, option, fallback='')
             # Switch handling
             if isinstance(input_widget, Switch):
                 input_widget.active = value.lower() in ('true', '1', 'yes', 'tak')
@@ -150,6 +149,7 @@ class ConfigScreen(Screen):
                 input_widget.text = value
 
     def save_data(self, instance):
+        values = {}
         for key, input_widget in self.inputs.items():
             section, option = key.split('.')
             # Switch handling
@@ -160,11 +160,9 @@ class ConfigScreen(Screen):
                 value = input_widget.text.strip()
                 if 'password' in option: 
                     value = value.encode('utf-8').hex()
-            if not self.parser.has_section(section): 
-                self.parser.add_section(section)
-            self.parser.set(section, option, value)
-        with open(INI_PATH, 'w', encoding='utf-8') as f: 
-            self.parser.write(f)
+            values.setdefault(section, {})[option] = value
+        # Atomic write (skipped when nothing changed); subscribers such as the logger are notified
+        get_config(INI_PATH).update(values)
         # Popup with OK button
         content = BoxLayout(orientation='vertical', padding=20, spacing=15)
         content.add_widget(Label(text="Configuration saved successfully."))
@@ -1,131 +1,219 @@
 import os
+import atexit
 import datetime
-import configparser
-import requests
+import struct
+from array import array
+from itertools import islice
 import time
-from garminconnect import Garmin, GarminConnectAuthenticationError, GarminConnectTooManyRequestsError
+
+from app_config import get_config
+from log_writer import LogWriter
+
+# FFB2: bytes 7..10 hold the weight in the middle 24 bits (nibble-aligned)
+FFB2_LAYOUT = struct.Struct('>7xI')
+# FFB3: fat, water, muscle, bone (bytes 18-21), BMR (24-25), BMI (26), visceral fat (28), metabolic age (30)
+FFB3_LAYOUT = struct.Struct('>18x4B2xHBxBxB')
+FFB3_MIN_LENGTH = 35
+
+def as_packet_bytes(packet):
+    """Returns a bytes-like view of a packet given either as raw bytes or as a hex string."""
+    if isinstance(packet, str):
+        return bytes.fromhex(packet.replace(' ', ''))
+    return packet
+
+_log_writer = LogWriter()
+_log_files = {}
+atexit.register(_log_writer.close)
+
+def _resolve_log_file(ini_path):
+    """Returns the log file path for the given ini file; cached until the config changes."""
+    log_file = _log_files.get(ini_path)
+    if log_file is None:
+        cfg = get_config(ini_path)
+        cfg.subscribe(_on_config_change)
+        base_dir = os.path.dirname(os.path.dirname(ini_path)) # goes to app folder
+        log_dir = os.path.join(base_dir, 'data', 'log')
+        os.makedirs(log_dir, exist_ok=True)
+        log_file = os.path.join(log_dir, cfg.log_file_name)
+        _log_files[ini_path] = log_file
+    return log_file
+
+def invalidate_log_path(ini_path=None):
+    """Forgets the cached log path (called when the config file changes)."""
+    if ini_path is None:
+        _log_files.clear()
+    else:
+        _log_files.pop(str(ini_path), None)
+
+def _on_config_change(cfg):
+    invalidate_log_path()
+
+def flush_logs():
+    """Writes all queued log lines to disk (e.g. on application stop)."""
+    _log_writer.flush()
 
 def loguj(msg, dopisek="", ini_path=None):
     """Simple function for logging messages to a file or console."""
     ts = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     line = f"[{ts}] {dopisek}: {msg}"
     if ini_path:
-        cfg = configparser.ConfigParser()
-        cfg.read(ini_path, encoding='utf-8')
         try:
-            # Corrected log path
-            base_dir = os.path.dirname(os.path.dirname(ini_path)) # goes to app folder
-            log_dir = os.path.join(base_dir, 'data', 'log')
-            os.makedirs(log_dir, exist_ok=True)
-            log_file = os.path.join(log_dir, cfg.get('PROGRAM', 'nazwa_pliku_log', fallback='fitogar_log.txt'))
-            
-            with open(log_file, "a", encoding="utf-8") as f:
-                f.write(line + "\n")
+            _log_writer.write(_resolve_log_file(str(ini_path)), line)
             return
         except Exception as e:
             print(f"LOG WRITE ERROR: {e}")
             pass
     print(line)
 
-def find_fitogar_weight(pakiety, min_stable=29, on_update=None):
+class StabilityTracker:
+    """
+    Incremental stability detector for FFB2 packets.
+    Takes one packet at a time and keeps only the current run length and the last
+    stabilization fragment, so every update costs O(1) regardless of session length.
+    """
+    def __init__(self, min_stable=29):
+        self.min_stable = min_stable
+        self.reset()
+
+    def reset(self):
+        """Forgets the current run (e.g. before a new measurement)."""
+        self.last_frag = None
+        self.counter = 0
+        self.weight = None
+        self.is_stable = False
+
+    def push(self, packet):
+        """
+        Feeds a single packet (raw bytes or hex string). Returns (weight, counter, is_stable)
+        or None if the packet is too short to contain a weight.
+        """
+        buf = memoryview(as_packet_bytes(packet))
+        if len(buf) < FFB2_LAYOUT.size:
+            # A short packet breaks the run of identical packets
+            self.last_frag = None
+            self.counter = 0
+            return None
+
+        # The first two bytes are a rolling counter - ignore them for stability
+        stabil_frag = buf[2:]
+        if self.last_frag is not None and stabil_frag == self.last_frag:
+            self.counter += 1
+        else:
+            self.last_frag = stabil_frag.tobytes()
+            self.counter = 1
+
+        raw = (FFB2_LAYOUT.unpack_from(buf)[0] >> 4) & 0xFFFFFF
+        self.weight = round(raw / 16000.0, 2) if raw else 0.0
+        self.is_stable = self.counter >= self.min_stable
+        return self.weight, self.counter, self.is_stable
+
+class PacketRing:
     """
-    IMPROVED VERSION: Processes a list of packets to find the weight and check stability,
+    Fixed-capacity packet buffer backed by one preallocated bytearray.
+    Keeps only the newest `capacity` packets; older ones are dropped (they are
+    already in the session capture file). `total` counts every appended packet.
+    Slots grow when a longer notification arrives (larger MTU, other firmware), up to
+    MAX_PACKET_SIZE - the longest value an ATT attribute can have. Longer packets are dropped
+    (append() returns False; the caller reports it).
+    """
+    MAX_PACKET_SIZE = 512
+
+    def __init__(self, capacity=64, slot_size=64):
+        self.capacity = capacity
+        self.slot_size = slot_size
+        self._buf = bytearray(capacity * slot_size)
+        self._lengths = array('H', bytes(2 * capacity))
+        self.clear()
+
+    def clear(self):
+        self._start = 0
+        self._len = 0
+        self.total = 0
+
+    def append(self, packet):
+        """Stores a packet; returns False (packet dropped) when it is longer than MAX_PACKET_SIZE."""
+        size = len(packet)
+        if size > self.slot_size:
+            if size > self.MAX_PACKET_SIZE:
+                return False
+            self._resize_slots(size)
+        if self._len < self.capacity:
+            slot = (self._start + self._len) % self.capacity
+            self._len += 1
+        else:
+            slot = self._start
+            self._start = (self._start + 1) % self.capacity
+        offset = slot * self.slot_size
+        self._buf[offset:offset + size] = packet
+        self._lengths[slot] = size
+        self.total += 1
+        return True
+
+    def _resize_slots(self, size):
+        """Reallocates the buffer with slots of at least `size` bytes, keeping the stored packets."""
+        packets = list(self)
+        self.slot_size = min(self.MAX_PACKET_SIZE, max(size, self.slot_size * 2))
+        self._buf = bytearray(self.capacity * self.slot_size)
+        for i, packet in enumerate(packets):
+            offset = i * self.slot_size
+            self._buf[offset:offset + len(packet)] = packet
+            self._lengths[i] = len(packet)
+        self._start = 0
+
+    def __len__(self):
+        return self._len
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self._len
+        if not 0 <= index < self._len:
+            raise IndexError("PacketRing index out of range")
+        slot = (self._start + index) % self.capacity
+        offset = slot * self.slot_size
+        return bytes(self._buf[offset:offset + self._lengths[slot]])
+
+    def __iter__(self):
+        for i in range(self._len):
+            yield self[i]
+
+def find_fitogar_weight(pakiety, min_stable=29, on_update=None, tracker=None):
+    """
+    Processes a list (or PacketRing) of packets to find the weight and check stability,
     ignoring the first two bytes of the packet.
+    Thin wrapper around StabilityTracker: when a tracker that has already seen
+    all previous packets is passed, only the newest packet is processed.
     """
     if not pakiety: return
-    
-    packet_hex = pakiety[-1]
-    pkt_hex = packet_hex.replace(' ', '').lower()
-    if len(pkt_hex) < 22: return
     try:
-        data_hex = pkt_hex[14:22]
-        if len(data_hex) < 8: return
-        weight_frag = data_hex[1:-1]
-        
-        if weight_frag == '000000':
-            weight = 0.0
-        else:
-            kg = int(weight_frag, 16) / 16000.0
-            weight = round(kg, 2)
-
-        # Improved logic for counting stable packets
-        counter = 0
-        if len(pakiety) > 1:
-            current_stabil_frag = pkt_hex[4:]
-            # Count how many times the same stabilization fragment occurs at the end of the list
-            for p in reversed(pakiety):
-                p_hex = p.replace(' ', '').lower()
-                if len(p_hex) >= 22 and p_hex[4:] == current_stabil_frag:
-                    counter += 1
-                else:
-                    break # Stop when a different packet is found
-        else:
-            counter = 1
-            
-        is_stable = counter >= min_stable
-            
+        if tracker is None:
+            tracker = StabilityTracker(min_stable)
+            for packet in islice(pakiety, len(pakiety) - 1):
+                tracker.push(packet)
+        result = tracker.push(pakiety[-1])
+        if result is None: return
         if on_update:
-            on_update(weight, counter, is_stable) # Added returning stability status
+            on_update(*result) # weight, counter, stability status
     except Exception as e:
         loguj(f"Weight decoding error: {e}", dopisek="ERROR")
-        # Helper function to get ini path from default location or argument
-        def get_ini_path(ini_path=None):
-            """Returns the path to the ini file, default 'config/waga.ini'."""
-            if ini_path and os.path.exists(ini_path):
-                return ini_path
-            default = os.path.join(os.path.dirname(__file__), '..', '..', 'config', 'waga.ini')
-            return os.path.abspath(default)
 
-def dekoduj_ffb3(hex_packet):
-    """Decodes FFB3 packet with body analysis data from FiToGar scale"""
+def dekoduj_ffb3_bytes(data):
+    """Decodes a raw FFB3 notification (body analysis) straight from the buffer."""
     try:
-        if not hex_packet or len(hex_packet) < 70:
-            print(f"Error: Packet too short: {len(hex_packet) if hex_packet else 0} characters")
+        if not data or len(data) < FFB3_MIN_LENGTH:
+            print(f"Error: Packet too short: {len(data) if data else 0} bytes")
             return None
-        
-        # Log received packet for diagnostics
-        print(f"Decoding packet: {hex_packet}")
-        
-        # Improved helper function for little-endian conversion
-        def extract_value(pos, length=4, divide_by=10.0):
-            if pos + length > len(hex_packet):
-                return 0
-            value_hex = hex_packet[pos:pos+length]
-            if len(value_hex) != length:
-                return 0
-                
-            # Correction - big-endian format for 16-bit numbers
-            if length == 4:
-                value = int(value_hex, 16)
-            else:
-                value = int(value_hex, 16)
-                
-            return value / divide_by
-        
-        # Corrected positions in the packet
-        # Example packet: 19002600a768637ace256d7aa2000a00690b360b0506cd079800420a0309d4064006e91212f35b0100d002
-        
-        # Extract values from the packet (after position correction)
-        fat_perc = round(extract_value(36, 2, 1.0), 1)    # Fat %
-        water_perc = round(extract_value(38, 2, 1.0), 1)  # Water %
-        muscle_perc = round(extract_value(40, 2, 1.0), 1) # Muscle %
-        bone_perc = round(extract_value(42, 2, 10.0), 1)  # Bone % - divided by 10
-        bmi = round(extract_value(52, 2, 10.0), 1)        # BMI - divided by 10
-        bmr = int(extract_value(48, 4, 1.0))              # BMR (kcal)
-        
-        # Additional values
-        visceral_fat = int(extract_value(56, 2, 10.0))    # Visceral fat
-        metabolic_age = int(extract_value(60, 2, 1.0))    # Metabolic age
-        
+
+        fat, water, muscle, bone, bmr, bmi, visceral_fat, metabolic_age = FFB3_LAYOUT.unpack_from(data)
+
         # Return dictionary with processed values
         return {
-            'Fat %': fat_perc,
-            'Water %': water_perc,
-            'Muscle %': muscle_perc,
-            'Bone %': bone_perc,
+            'Fat %': float(fat),
+            'Water %': float(water),
+            'Muscle %': float(muscle),
+            'Bone %': round(bone / 10.0, 1),      # Bone % - divided by 10
             'BMR (kcal)': bmr,
-            'BMI': bmi,
-            'Visceral fat': visceral_fat,
+            'BMI': round(bmi / 10.0, 1),          # BMI - divided by 10
+            'Visceral fat': int(visceral_fat / 10.0),
             'Metabolic age': metabolic_age
         }
     except Exception as e:
@@ -134,14 +222,25 @@ def dekoduj_ffb3(hex_packet):
         traceback.print_exc()
         return None
 
+def dekoduj_ffb3(hex_packet):
+    """Decodes FFB3 packet with body analysis data from FiToGar scale"""
+    # Example packet: 19002600a768637ace256d7aa2000a00690b360b0506cd079800420a0309d4064006e91212f35b0100d002
+    if isinstance(hex_packet, (bytes, bytearray, memoryview)):
+        return dekoduj_ffb3_bytes(hex_packet)
+    try:
+        data = as_packet_bytes(hex_packet) if hex_packet else b''
+    except ValueError as e:
+        print(f"FFB3 packet decoding error: {e}")
+        return None
+    return dekoduj_ffb3_bytes(data)
+
 def validate_ini_config(ini_path='config/waga.ini') -> bool:
     """Checks if the .ini config file contains required fields."""
-    if not os.path.exists(ini_path):
+    cfg = get_config(ini_path)
+    if not cfg.exists:
         print(f"CRITICAL ERROR: Config file does not exist at '{ini_path}'")
         return False
         
-    cfg = configparser.ConfigParser()
-    cfg.read(ini_path, encoding='utf-8')
     errors = []
     required = {
         'PROGRAM': ['nazwa_pliku_log'],
@@ -162,21 +261,22 @@ def validate_ini_config(ini_path='config/waga.ini') -> bool:
         
     return True
 
-def send_to_garmin_gc(waga: float, ini_path='config/waga.ini', ffb3_pkt=None) -> bool:
+def send_to_garmin_gc(waga: float, ini_path='config/waga.ini', ffb3_pkt=None, timestamp=None) -> bool:
     """Sends data to Garmin Connect and returns operation status (True/False)."""
-    cfg = configparser.ConfigParser()
-    cfg.read(ini_path, encoding='utf-8')
-    email = cfg.get("GARMIN", "garmin_email")
-    password_hex = cfg.get("GARMIN", "garmin_password_hex", fallback=None)
-    if not password_hex:
+    cfg = get_config(ini_path)
+    email = cfg.garmin_email
+    password = cfg.garmin_password
+    if not password:
         loguj("Missing password (garmin_password_hex) in config file.", dopisek="error", ini_path=ini_path)
         return False
-    password = bytes.fromhex(password_hex).decode("utf-8")
-    ts = datetime.datetime.now().isoformat()
-    try:        
-        garmin = Garmin(email, password)
-        garmin.login()
-        garmin.add_body_composition(weight=waga, timestamp=ts)
+    ts = timestamp or datetime.datetime.now().isoformat()
+    # garminconnect is imported on first upload, not at app start
+    from garminconnect import GarminConnectAuthenticationError, GarminConnectTooManyRequestsError
+    from garmin_session import get_garmin_session
+    try:
+        session = get_garmin_session(
+            ini_path, log=lambda msg, level="INFO": loguj(msg, dopisek=f"gc [{level}]", ini_path=ini_path))
+        session.call(email, password, lambda garmin: garmin.add_body_composition(weight=waga, timestamp=ts))
         loguj(f"{waga:.2f} kg → Garmin Connect OK", dopisek="gc", ini_path=ini_path)
         return True
     except (GarminConnectAuthenticationError, GarminConnectTooManyRequestsError) as e:
@@ -185,22 +285,50 @@ def send_to_garmin_gc(waga: float, ini_path='config/waga.ini', ffb3_pkt=None) ->
         loguj(f"GC SEND ERROR: {e}", dopisek="error", ini_path=ini_path)
     return False
 
-def send_to_garmin_api(weight: float, ini_path='config/waga.ini') -> bool:
+_http_session = None
+
+def get_http_session():
+    """Returns the shared requests.Session (keep-alive connection pool with retries)."""
+    global _http_session
+    if _http_session is None:
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+        # POST is not idempotent: retry only when the server surely did not take the body -
+        # connection errors, and 429/503 that come with Retry-After. 502/504 may arrive after the
+        # upstream accepted the upload, so those go back to the outbox instead of being resent here.
+        class PostRetry(Retry):
+            RETRY_AFTER_STATUS_CODES = frozenset({429, 503})
+
+        retry = PostRetry(total=3, connect=3, read=0, other=0, status=2, backoff_factor=0.5,
+                          status_forcelist=(), respect_retry_after_header=True,
+                          allowed_methods=frozenset({'POST'}), raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=4, max_retries=retry)
+        session = requests.Session()
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        _http_session = session
+    return _http_session
+
+def _read_api_settings(ini_path):
+    cfg = get_config(ini_path)
+    if not all(cfg.has_option('GARMIN', key) for key in ('garmin_email', 'api_token', 'api_url')):
+        return None
+    return {'email': cfg.garmin_email, 'token': cfg.api_token, 'url': cfg.api_url, 'batch': cfg.api_batch}
+
+def _api_headers(settings):
+    return {'Authorization': f"Bearer {settings['token']}", 'Content-Type': 'application/json'}
+
+def send_to_garmin_api(weight: float, ini_path='config/waga.ini', timestamp=None, settings=None) -> bool:
     """Sends data to external API and returns operation status (True/False)."""
-    cfg = configparser.ConfigParser()
-    cfg.read(ini_path, encoding='utf-8')
-    try:
-        email = cfg.get('GARMIN', 'garmin_email')
-        token = cfg.get('GARMIN', 'api_token')
-        url = cfg.get('GARMIN', 'api_url')
-    except Exception:
+    settings = settings or _read_api_settings(ini_path)
+    if not settings:
         return False
         
-    headers = {'Authorization': f"Bearer {token}", 'Content-Type': 'application/json'}
-    payload = {'email': email, 'timestamp': datetime.datetime.now().isoformat(), 'weight_kg': round(weight, 2)}
+    payload = {'email': settings['email'], 'timestamp': timestamp or datetime.datetime.now().isoformat(), 'weight_kg': round(weight, 2)}
     
     try:
-        resp = requests.post(url, json=payload, headers=headers, timeout=10)
+        resp = get_http_session().post(settings['url'], json=payload, headers=_api_headers(settings), timeout=10)
         resp.raise_for_status()
         loguj(f"{weight:.2f} kg → API {resp.status_code}", dopisek="api", ini_path=ini_path)
         return True
@@ -208,16 +336,67 @@ def send_to_garmin_api(weight: float, ini_path='config/waga.ini') -> bool:
         loguj(f"API ERROR: {e}", dopisek="error", ini_path=ini_path)
     return False
 
-def send_to_garmin(weight: float, ini_path='config/waga.ini', ffb3_pkt=None) -> bool:
+def send_to_garmin_api_batch(entries, ini_path='config/waga.ini', settings=None):
+    """
+    Sends several queued measurements (weight + body composition) in one API request.
+    Returns a list of True/False, one per entry (the request succeeds or fails as a whole).
+    """
+    settings = settings or _read_api_settings(ini_path)
+    if not settings:
+        return [False] * len(entries)
+
+    payload = {
+        'email': settings['email'],
+        'measurements': [
+            {
+                'timestamp': entry.get('measured_at') or datetime.datetime.now().isoformat(),
+                'weight_kg': round(entry['weight'], 2),
+                'composition': entry.get('composition'),
+            }
+            for entry in entries
+        ],
+    }
+    try:
+        resp = get_http_session().post(settings['url'], json=payload, headers=_api_headers(settings), timeout=20)
+        resp.raise_for_status()
+        loguj(f"{len(entries)} measurement(s) → API batch {resp.status_code}", dopisek="api", ini_path=ini_path)
+        return [True] * len(entries)
+    except Exception as e:
+        loguj(f"API BATCH ERROR: {e}", dopisek="error", ini_path=ini_path)
+    return [False] * len(entries)
+
+def send_to_garmin(weight: float, ini_path='config/waga.ini', ffb3_pkt=None, timestamp=None) -> bool:
     """MAIN ENTRY: automatic selection of GC or API. Returns True/False."""
-    cfg = configparser.ConfigParser()
-    cfg.read(ini_path, encoding='utf-8')
-    mode = cfg.get('GARMIN', 'tryb_wysylki', fallback='gc').lower()
+    mode = get_config(ini_path).send_mode
     
     if mode == 'gc':
-        return send_to_garmin_gc(weight, ini_path=ini_path, ffb3_pkt=ffb3_pkt)
+        return send_to_garmin_gc(weight, ini_path=ini_path, ffb3_pkt=ffb3_pkt, timestamp=timestamp)
     elif mode == 'api':
-        return send_to_garmin_api(weight, ini_path=ini_path)
+        return send_to_garmin_api(weight, ini_path=ini_path, timestamp=timestamp)
     else:
         loguj(f"Unknown tryb_wysylki: {mode}", dopisek="error", ini_path=ini_path)
         return False
+
+def send_measurements(entries, ini_path='config/waga.ini'):
+    """
+    Uploads queued measurements (dicts with 'weight', 'measured_at', 'composition', 'ffb3_packet') in one go.
+    All entries share the warm Garmin session or the pooled HTTP session
+    (or a single request in API batch mode); stops at the first failure.
+    Returns a list of True/False, one per attempted entry.
+    """
+    settings = None
+    if get_config(ini_path).send_mode == 'api':
+        settings = _read_api_settings(ini_path)
+        if settings and settings['batch']:
+            return send_to_garmin_api_batch(entries, ini_path, settings=settings)
+
+    results = []
+    for entry in entries:
+        if settings:
+            ok = send_to_garmin_api(entry['weight'], ini_path, timestamp=entry.get('measured_at'), settings=settings)
+        else:
+            ok = send_to_garmin(entry['weight'], ini_path, entry.get('ffb3_packet'), timestamp=entry.get('measured_at'))
+        results.append(ok)
+        if not ok:
+            break
+    return results
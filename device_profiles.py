@@ -0,0 +1,107 @@
+import json
+import os
+import threading
+import time
+
+from app_config import no_log, shared_data_object
+
+PROFILE_FILE_NAME = 'device_profiles.json'
+
+class StaleProfileError(Exception):
+    """The cached GATT layout does not match the connected device."""
+
+def profile_key(mac, firmware_rev):
+    return f"{(mac or '').upper()}|{firmware_rev or '-'}"
+
+def profile_from_services(services):
+    """Builds {char uuid: {'service', 'handle', 'properties'}} from a discovered GATT tree."""
+    chars = {}
+    for svc in services:
+        for char in svc.characteristics:
+            chars.setdefault(str(char.uuid).lower(), {
+                'service': str(svc.uuid).lower(),
+                'handle': char.handle,
+                'properties': list(char.properties),
+            })
+    return {'characteristics': chars, 'saved_at': time.time()}
+
+def service_uuids(profile, char_uuids):
+    """Services that hold `char_uuids` — passed to BleakClient(services=...) to limit discovery."""
+    chars = profile['characteristics']
+    return sorted({chars[uuid.lower()]['service'] for uuid in char_uuids})
+
+async def subscribe_cached(client, profile, handlers):
+    """
+    Subscribes handlers {char uuid: callback} using the cached handles.
+    Raises StaleProfileError when a handle is missing or now belongs to another characteristic.
+    """
+    chars = profile['characteristics']
+    for uuid, callback in handlers.items():
+        cached = chars.get(uuid.lower())
+        if cached is None:
+            raise StaleProfileError(f"{uuid} not in the cached profile")
+        char = client.services.get_characteristic(cached['handle']) if client.services else None
+        if char is None or str(char.uuid).lower() != uuid.lower():
+            raise StaleProfileError(f"handle {cached['handle']} no longer points to {uuid}")
+        await client.start_notify(char, callback)
+
+class DeviceProfileCache:
+    """
+    GATT layouts of known scales, keyed by MAC and firmware revision and stored as JSON under data/.
+    A reconnect can then ask only for the needed service and subscribe by handle
+    instead of waiting for a full service discovery.
+    """
+    def __init__(self, path, log=None):
+        self.path = str(path)
+        self.log = log or no_log
+        self._lock = threading.Lock()
+        self._profiles = self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self):
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._profiles, f, indent=1)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            self.log(f"Could not store device profiles: {e}", "WARNING")
+
+    def get(self, mac, firmware_rev):
+        with self._lock:
+            return self._profiles.get(profile_key(mac, firmware_rev))
+
+    def put(self, mac, firmware_rev, services):
+        """Stores the layout of a fully discovered device. Returns the profile."""
+        profile = profile_from_services(services)
+        with self._lock:
+            old = self._profiles.get(profile_key(mac, firmware_rev))
+            if old and old.get('characteristics') == profile['characteristics']:
+                return old
+            self._profiles[profile_key(mac, firmware_rev)] = profile
+            self._save()
+        self.log(f"Device profile saved for {mac} (fw {firmware_rev or '-'}).")
+        return profile
+
+    def invalidate(self, mac, firmware_rev=None):
+        """Drops the profile of one firmware revision, or every profile of `mac`."""
+        with self._lock:
+            if firmware_rev is not None:
+                keys = [profile_key(mac, firmware_rev)]
+            else:
+                keys = [k for k in self._profiles if k.startswith(f"{(mac or '').upper()}|")]
+            removed = [self._profiles.pop(k) for k in keys if k in self._profiles]
+            if removed:
+                self._save()
+        return bool(removed)
+
+def get_device_profiles(ini_path, log=None):
+    """Returns the shared DeviceProfileCache of the app that owns `ini_path` (stored in data/)."""
+    return shared_data_object(ini_path, PROFILE_FILE_NAME, lambda path: DeviceProfileCache(path, log=log))
@@ -0,0 +1,125 @@
+import json
+import os
+import threading
+import time
+
+from app_config import no_log, shared_data_object
+
+DEFAULT_TOKEN_TTL = 30 * 24 * 3600  # used when the client does not report token expiry
+TOKEN_FILE_NAME = 'garmin_tokens.json'
+
+class GarminSession:
+    """
+    Garmin Connect session cache.
+    Logs in once, keeps the warm client for later uploads and persists the OAuth tokens
+    (garth dump) with an expiry, so a restarted app does not repeat the full SSO handshake.
+    `client_factory` is the Garmin class by default (imported on first login); tests can pass a local stub
+    together with the `auth_error` exception class it raises for an expired session.
+    """
+    def __init__(self, token_path, client_factory=None, token_ttl=DEFAULT_TOKEN_TTL, auth_error=None, log=None):
+        self.token_path = str(token_path)
+        self.client_factory = client_factory
+        self.auth_error = auth_error
+        self.token_ttl = token_ttl
+        self.log = log or no_log
+        self._client = None
+        self._email = None
+        self._lock = threading.RLock()
+
+    def get_client(self, email, password):
+        """Returns a logged-in client, reusing the warm one or stored tokens when possible."""
+        with self._lock:
+            if self._client is not None and self._email == email:
+                return self._client
+            if self.client_factory is None:
+                from garminconnect import Garmin
+                self.client_factory = Garmin
+
+            tokens = self._load_tokens(email)
+            if tokens:
+                client = self.client_factory(email, password)
+                try:
+                    client.login(tokens)
+                    self.log("Garmin session restored from stored tokens.")
+                    return self._keep(email, client)
+                except Exception as e:
+                    self.log(f"Stored Garmin tokens rejected: {e}", "WARNING")
+                    self._delete_tokens()
+
+            client = self.client_factory(email, password)
+            client.login()
+            self.log("Garmin login OK.")
+            self._save_tokens(email, client)
+            return self._keep(email, client)
+
+    def call(self, email, password, func):
+        """
+        Runs func(client) with a logged-in client.
+        On an authentication failure the session is dropped and func is retried once after a fresh login.
+        """
+        with self._lock:
+            client = self.get_client(email, password)
+            try:
+                return func(client)
+            except self._auth_error() as e:
+                self.log(f"Garmin session expired ({e}), logging in again.", "WARNING")
+                self.invalidate()
+                return func(self.get_client(email, password))
+
+    def _auth_error(self):
+        if self.auth_error is None:
+            try:
+                from garminconnect import GarminConnectAuthenticationError
+                self.auth_error = GarminConnectAuthenticationError
+            except ImportError:
+                self.auth_error = ()  # stub client without garminconnect: nothing to retry on
+        return self.auth_error
+
+    def invalidate(self):
+        """Forgets the warm client and the stored tokens."""
+        with self._lock:
+            self._client = None
+            self._email = None
+            self._delete_tokens()
+
+    def _keep(self, email, client):
+        self._client = client
+        self._email = email
+        return client
+
+    def _load_tokens(self, email):
+        try:
+            with open(self.token_path, 'r', encoding='utf-8') as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if stored.get('email') != email or stored.get('expires_at', 0) <= time.time():
+            return None
+        return stored.get('tokens')
+
+    def _save_tokens(self, email, client):
+        garth = getattr(client, 'garth', None)
+        if garth is None or not hasattr(garth, 'dumps'):
+            return
+        try:
+            oauth2 = getattr(garth, 'oauth2_token', None)
+            expires_at = getattr(oauth2, 'refresh_token_expires_at', None) or time.time() + self.token_ttl
+            stored = {'email': email, 'tokens': garth.dumps(), 'saved_at': time.time(), 'expires_at': expires_at}
+            os.makedirs(os.path.dirname(self.token_path) or '.', exist_ok=True)
+            tmp_path = self.token_path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(stored, f)
+            os.chmod(tmp_path, 0o600)
+            os.replace(tmp_path, self.token_path)
+        except Exception as e:
+            self.log(f"Could not store Garmin tokens: {e}", "WARNING")
+
+    def _delete_tokens(self):
+        try:
+            os.remove(self.token_path)
+        except OSError:
+            pass
+
+def get_garmin_session(ini_path, log=None):
+    """Returns the shared GarminSession for the app that owns `ini_path` (tokens live in data/)."""
+    return shared_data_object(ini_path, TOKEN_FILE_NAME, lambda path: GarminSession(path, log=log))
@@ -0,0 +1,96 @@
+import asyncio
+
+DIS_CHARACTERISTICS = {
+    "00002a29-0000-1000-8000-00805f9b34fb": "manufacturer",
+    "00002a24-0000-1000-8000-00805f9b34fb": "model",
+    "00002a25-0000-1000-8000-00805f9b34fb": "serial_number",
+    "00002a27-0000-1000-8000-00805f9b34fb": "hardware_rev",
+    "00002a26-0000-1000-8000-00805f9b34fb": "firmware_rev",
+    "00002a28-0000-1000-8000-00805f9b34fb": "software_rev",
+    "00002a23-0000-1000-8000-00805f9b34fb": "system_id",
+}
+
+GAS_CHARACTERISTICS = {
+    "00002a00-0000-1000-8000-00805f9b34fb": "device_name",
+    "00002a01-0000-1000-8000-00805f9b34fb": "appearance",
+    "00002a04-0000-1000-8000-00805f9b34fb": "ppcp",
+    "00002aa6-0000-1000-8000-00805f9b34fb": "car",
+    "00002ac9-0000-1000-8000-00805f9b34fb": "rpa_only",
+}
+
+READ_CONCURRENCY = 4   # parallel read_gatt_char requests in flight
+READ_TIMEOUT = 5.0     # seconds per single read
+
+def build_char_index(services):
+    """Builds {uuid (lowercase): [characteristic, ...]} in one pass over the GATT tree."""
+    index = {}
+    for svc in services:
+        for char in svc.characteristics:
+            index.setdefault(str(char.uuid).lower(), []).append(char)
+    return index
+
+def format_char_value(key, val):
+    """Returns (value for waga.ini, text for the log) of a raw characteristic value."""
+    try:
+        decoded = val.decode("utf-8", errors="replace").strip("\x00")
+        if key == "system_id" and len(val) >= 6:
+            value = ":".join(f"{b:02X}" for b in val)
+        elif key == "ppcp" and len(val) == 8:
+            min_int = int.from_bytes(val[0:2], 'little') * 1.25
+            max_int = int.from_bytes(val[2:4], 'little') * 1.25
+            latency = int.from_bytes(val[4:6], 'little')
+            timeout = int.from_bytes(val[6:8], 'little') * 10
+            value = f"min={min_int:.1f}ms, max={max_int:.1f}ms, latency={latency}, timeout={timeout}ms"
+        elif key == "car" and len(val) == 1:
+            value = "enabled" if val[0] == 1 else "disabled"
+        else:
+            value = decoded
+        return value, f"✔️ Read {key}: {decoded}"
+    except Exception:
+        return val.hex(), f"✔️ Read {key}: {val.hex()} (hex fallback)"
+
+async def read_device_info(client, services=None, concurrency=READ_CONCURRENCY, timeout=READ_TIMEOUT):
+    """
+    Reads the GAS/DIS characteristics of a connected client.
+    The UUID index is built once; readable characteristics are read in parallel
+    (at most `concurrency` at a time, each limited to `timeout` seconds).
+    Returns (info, log_attempts) with log lines in the same order as before.
+    """
+    index = build_char_index(client.services if services is None else services)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def read_one(zbior, uuid, key):
+        char_list = index.get(uuid, [])
+        if not char_list:
+            return key, "---", [f"[{zbior}] {key} ({uuid}): no characteristics."]
+
+        log = [f"[{zbior}] {key} | char#{i+1} | handle={char.handle} | props={char.properties}"
+               for i, char in enumerate(char_list)]
+
+        char = next((c for c in char_list if 'read' in c.properties), None)
+        if char:
+            try:
+                async with semaphore:
+                    val = await asyncio.wait_for(client.read_gatt_char(char), timeout)
+                value, line = format_char_value(key, val)
+            except asyncio.TimeoutError:
+                value, line = "---", f"❌ Read error {key}: timeout after {timeout:.1f}s"
+            except Exception as e:
+                value, line = "---", f"❌ Read error {key}: {e}"
+        elif any('notify' in c.properties for c in char_list):
+            value, line = "[notify only]", f"ℹ️ {key}: notify only — skip read."
+        else:
+            value, line = "---", f"⚠️ {key}: no 'read'/'notify'."
+        log.append(line)
+        return key, value, log
+
+    jobs = [read_one(zbior, uuid, key)
+            for uuid_map, zbior in [(GAS_CHARACTERISTICS, "GAS"), (DIS_CHARACTERISTICS, "DIS")]
+            for uuid, key in uuid_map.items()]
+
+    info = {}
+    log_attempts = []
+    for key, value, log in await asyncio.gather(*jobs):
+        info[key] = value
+        log_attempts.extend(log)
+    return info, log_attempts
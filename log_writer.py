@@ -0,0 +1,89 @@
+import queue
+import threading
+import time
+
+class LogWriter:
+    """
+    Background writer for log lines.
+    Callers only enqueue (path, line) records; a daemon thread appends them to disk
+    in batches, when `batch_size` lines are pending or `flush_interval` seconds passed.
+    """
+    _FLUSH = object()
+    _STOP = object()
+
+    def __init__(self, flush_interval=1.0, batch_size=200):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def write(self, path, line):
+        """Enqueues one line for `path`. Never touches the disk in the calling thread."""
+        self._ensure_started()
+        self._queue.put((path, line))
+
+    def flush(self, timeout=5.0):
+        """Blocks until everything enqueued so far is on disk."""
+        if not self._thread or not self._thread.is_alive():
+            return
+        done = threading.Event()
+        self._queue.put((self._FLUSH, done))
+        done.wait(timeout)
+
+    def close(self, timeout=5.0):
+        """Flushes pending lines and stops the writer thread."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if not thread or not thread.is_alive():
+            return
+        self._queue.put((self._STOP, None))
+        thread.join(timeout)
+
+    def _ensure_started(self):
+        if self._thread and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="LogWriter", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        pending = {}
+        count = 0
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                path, item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                path = None
+
+            if path is None or path is self._FLUSH or path is self._STOP:
+                self._write_batch(pending)
+                pending, count, deadline = {}, 0, None
+                if path is self._FLUSH:
+                    item.set()
+                elif path is self._STOP:
+                    return
+                continue
+
+            pending.setdefault(path, []).append(item)
+            count += 1
+            if deadline is None:
+                deadline = time.monotonic() + self.flush_interval
+            if count >= self.batch_size:
+                self._write_batch(pending)
+                pending, count, deadline = {}, 0, None
+
+    @staticmethod
+    def _write_batch(pending):
+        for path, lines in pending.items():
+            try:
+                with open(path, "a", encoding="utf-8") as f:
+                    f.write("\n".join(lines) + "\n")
+            except Exception as e:
+                print(f"LOG WRITE ERROR: {e}")
+                for line in lines:
+                    print(line)
@@ -1,19 +1,76 @@
+import time
+_T_START = time.perf_counter()
+
+import importlib
 import os
-import sys
+from pathlib import Path
 from kivy.app import App
+from kivy.clock import Clock
 from kivy.core.window import Window
 from kivy.uix.screenmanager import ScreenManager
 
+INI_PATH = Path(__file__).parent / "config" / "waga.ini"
+
 # --- FiToGar ENGLISH VERSION ---
-# Import all screens of your application
-try:
-    from start_screen import StartScreen
-    from config_screen import ConfigScreen
-    from scan_screen import ScanScreen
-    from weigh_screen import WeighScreen
-except ImportError as e:
-    print(f"Import error: {e}. Make sure all screen files (start, config, scan, weigh) are in the main folder.")
-    sys.exit()
+# Screens are imported and built on first navigation (see LazyScreenManager);
+# only the start screen is needed for the first frame.
+SCREENS = {
+    'start': ('start_screen', 'StartScreen'),
+    'config': ('config_screen', 'ConfigScreen'),
+    'scan': ('scan_screen', 'ScanScreen'),
+    'weigh': ('weigh_screen', 'WeighScreen'),
+}
+
+
+class StartupTimer:
+    """Collects startup phases (import, build, first frame, lazy screens) in milliseconds."""
+    def __init__(self, started):
+        self.started = started
+        self.phases = []
+
+    def record(self, name, since):
+        now = time.perf_counter()
+        self.phases.append((name, (now - since) * 1000))
+        return now
+
+    def report(self):
+        total = (time.perf_counter() - self.started) * 1000
+        parts = ", ".join(f"{name} {ms:.0f} ms" for name, ms in self.phases)
+        return f"Startup: {parts} (total {total:.0f} ms)"
+
+STARTUP = StartupTimer(_T_START)
+_T_IMPORTED = STARTUP.record("imports", _T_START)
+
+
+class LazyScreenManager(ScreenManager):
+    """
+    ScreenManager that imports and builds a screen the first time it is shown.
+    Screens are registered as name -> (module, class) and created by get_screen().
+    """
+    def __init__(self, screens, **kwargs):
+        super().__init__(**kwargs)
+        self.factories = dict(screens)
+
+    def has_screen(self, name):
+        return name in self.factories or super().has_screen(name)
+
+    def get_screen(self, name):
+        if name in self.factories and name not in self.screen_names:
+            self.add_widget(self._build_screen(name, *self.factories.pop(name)))
+        return super().get_screen(name)
+
+    def _build_screen(self, name, module_name, class_name):
+        t0 = time.perf_counter()
+        try:
+            module = importlib.import_module(module_name)
+        except ImportError as e:
+            print(f"Import error: {e}. Make sure all screen files (start, config, scan, weigh) are in the main folder.")
+            raise
+        screen = getattr(module, class_name)(name=name)
+        STARTUP.record(f"screen '{name}'", t0)
+        if name != 'start':
+            print(f"Screen '{name}' built in {STARTUP.phases[-1][1]:.0f} ms")
+        return screen
 
 
 class FiToGarApp(App):
@@ -22,30 +79,43 @@ class FiToGarApp(App):
     """
     def build(self):
         """
-        Builds the user interface, loading all screens into the manager.
+        Builds the user interface; screens other than 'start' are created on first use.
         """
+        t0 = time.perf_counter()
         # On iOS do not set Window.size
         if not (os.environ.get('KIVY_BUILD') == 'ios' or os.environ.get('IOS') == '1'):
             Window.size = (600, 900)
         self.icon = 'assets/images/ico_mini.png'
         self.title = "FiToGar v.1.0.0 EN  pawel.eu"
-        
+
         # Set up the screen manager
-        sm = ScreenManager()
-        sm.add_widget(StartScreen(name='start'))
-        sm.add_widget(ConfigScreen(name='config'))
-        sm.add_widget(ScanScreen(name='scan'))
-        sm.add_widget(WeighScreen(name='weigh'))
-        
+        sm = LazyScreenManager(SCREENS)
         sm.current = 'start'
+        self._t_built = STARTUP.record("build", t0)
         return sm
 
+    def on_start(self):
+        # The next clock tick comes after the first frame has been drawn
+        Clock.schedule_once(self._first_frame, 0)
+
+    def _first_frame(self, dt):
+        STARTUP.record("first frame", self._t_built)
+        import dekodery
+        dekodery.loguj(STARTUP.report(), dopisek="startup", ini_path=str(INI_PATH))
+        # Decode the other screens' backgrounds in the background, so switching screens does not stall
+        import asset_cache
+        asset_cache.preload()
+
     def on_stop(self):
         """
         Method called when closing the application.
         """
         # Usuń obsługę asyncio na iOS, bo nie jest wspierane
-        pass
+        # Write out log lines still queued in the background writer
+        import dekodery
+        import upload_queue
+        upload_queue.stop_upload_queues()
+        dekodery.flush_logs()
 
 if __name__ == '__main__':
     # Na iOS używaj klasycznego run(), nie async_run
@@ -0,0 +1,236 @@
+import asyncio
+
+import advertisement
+import dekodery
+from app_config import no_log
+
+FFB2_WEIGHT_UUID = "0000ffb2-0000-1000-8000-00805f9b34fb"
+FFB3_BODY_COMP_UUID = "0000ffb3-0000-1000-8000-00805f9b34fb"
+MIN_STABLE_COUNT = 29
+FFB3_ANALYSIS_PACKET = 3   # body analysis is decoded from the 3rd FFB3 packet
+FFB3_FINAL_PACKET = 5
+FFB2_RING_CAPACITY = 64
+FFB3_RING_CAPACITY = 8
+STEP_OFF_WEIGHT = 1.0      # kg; a lower reading means the platform is empty
+
+# Measurement states, in order
+CONNECTING = 'connecting'
+STREAMING = 'streaming'
+STABLE = 'stable'
+COMPOSITION = 'composition'
+DONE = 'done'
+STATES = (CONNECTING, STREAMING, STABLE, COMPOSITION, DONE)
+
+class MeasurementSession:
+    """
+    State of a single measurement, independent of Kivy and Bluetooth.
+    The handle_* methods are the BLE notification handlers; results are reported
+    through the optional callbacks:
+      on_weight(weight, counter, is_stable), on_stable(weight),
+      on_ffb3_packet(packet_num), on_analysis(packet, results), on_complete()
+    In passive mode weight comes from advertisement frames (handle_adv_frame); with
+    require_composition=False the measurement is complete once the weight is stable.
+    """
+    def __init__(self, min_stable=MIN_STABLE_COUNT, log=None, log_packet=None):
+        self.min_stable = min_stable
+        self.log = log or no_log
+        self.log_packet = log_packet
+        self.adv_offset = 0
+        self.require_composition = True
+        self.on_weight = None
+        self.on_stable = None
+        self.on_ffb3_packet = None
+        self.on_analysis = None
+        self.on_complete = None
+        self.reset()
+
+    def reset(self, hold_weight=None):
+        """
+        Resets the internal measurement state. With `hold_weight` (the result just taken) nothing
+        is measured until the scale reads empty again, so a person who stays on the platform
+        is not measured twice.
+        """
+        self.held_weight = hold_weight
+        self.history_id = None  # measurement history row, set by whoever records the result
+        self.ffb2_packets = dekodery.PacketRing(max(FFB2_RING_CAPACITY, self.min_stable))
+        self.ffb3_packets = dekodery.PacketRing(FFB3_RING_CAPACITY)
+        self.stability_tracker = dekodery.StabilityTracker(self.min_stable)
+        self.stable_weight = None
+        self.stable_ffb3_packet = None
+        self.analysis = None
+        self.completed = False
+
+    def set_min_stable(self, min_stable):
+        """Changes the stability threshold, also for the run in progress."""
+        self.min_stable = min_stable
+        self.stability_tracker.min_stable = min_stable
+
+    @property
+    def is_complete(self):
+        return self.stable_weight is not None and (
+            self.stable_ffb3_packet is not None or not self.require_composition)
+
+    def handle_ffb2_notification(self, sender, data: bytearray):
+        if self.stable_weight is not None:
+            return
+        packet = bytes(data)
+        self.log(f"[FFB2] Packet received: {packet.hex()}")
+        if self.log_packet:
+            self.log_packet("FFB2", packet)
+        self._push_weight_packet(packet)
+
+    def handle_adv_frame(self, frame):
+        """Weight from a manufacturer-data advertisement frame (passive mode, no GATT connection)."""
+        if self.stable_weight is not None:
+            return
+        frame = bytes(frame)
+        if self.log_packet:
+            self.log_packet(advertisement.ADV_LABEL, frame)
+        packet = advertisement.weight_packet(frame, self.adv_offset)
+        if packet is not None:
+            self._push_weight_packet(packet)
+
+    def _push_weight_packet(self, packet):
+        if not self.ffb2_packets.append(packet):
+            self._dropped("FFB2", packet)
+            return
+        dekodery.find_fitogar_weight(
+            pakiety=self.ffb2_packets,
+            min_stable=self.min_stable,
+            on_update=self._weight_update,
+            tracker=self.stability_tracker
+        )
+
+    def _weight_update(self, weight, stability_counter, is_stable):
+        if self.on_weight:
+            self.on_weight(weight, stability_counter, is_stable)
+        if self.held_weight is not None:
+            if weight < STEP_OFF_WEIGHT:
+                self.log(f"Scale empty after {self.held_weight:.2f} kg, ready for the next measurement.")
+                self.held_weight = None
+            return
+        if is_stable and weight != 0.0 and self.stable_weight is None:
+            self.log(f"Stable weight: {weight:.2f} kg")
+            self.stable_weight = weight
+            if self.on_stable:
+                self.on_stable(weight)
+            self._check_complete()
+
+    def handle_ffb3_notification(self, sender, data: bytearray):
+        if self.held_weight is not None:
+            return
+        packet = bytes(data)
+        if self.log_packet:
+            self.log_packet("FFB3", packet)
+        if not self.ffb3_packets.append(packet):
+            self._dropped("FFB3", packet)
+            return
+        packet_num = self.ffb3_packets.total
+
+        self.log(f"[FFB3] Packet #{packet_num}: {packet.hex()}")
+        if self.on_ffb3_packet:
+            self.on_ffb3_packet(packet_num)
+
+        # Analyze after receiving the 3rd packet
+        if packet_num == FFB3_ANALYSIS_PACKET:
+            self.log(f"[FFB3] Decoding packet #{packet_num}")
+            self._set_analysis_packet(packet)
+
+        # Check after 5 packets (for compatibility)
+        if packet_num == FFB3_FINAL_PACKET:
+            if not self.stable_ffb3_packet:
+                self._set_analysis_packet(self.ffb3_packets[FFB3_ANALYSIS_PACKET - 1])
+            self._check_complete()
+
+    def _dropped(self, label, packet):
+        self.log(f"[{label}] {len(packet)} byte packet dropped "
+                 f"(longer than {dekodery.PacketRing.MAX_PACKET_SIZE} bytes)", "WARNING")
+
+    def _set_analysis_packet(self, packet):
+        self.stable_ffb3_packet = packet
+        self.analysis = dekodery.dekoduj_ffb3_bytes(packet)
+        if self.analysis:
+            self.log(f"FFB3 data decoded: {self.analysis}")
+        else:
+            self.log(f"FFB3 decoding error: {packet.hex()}", "ERROR")
+        if self.on_analysis:
+            self.on_analysis(packet, self.analysis)
+
+    def _check_complete(self):
+        if self.is_complete and not self.completed:
+            self.completed = True
+            if self.on_complete:
+                self.on_complete()
+
+class MeasurementFlow:
+    """
+    asyncio state machine on top of a MeasurementSession:
+    connecting -> streaming -> stable -> composition -> done.
+    Transitions are driven by the session callbacks (i.e. by the notification handlers),
+    so the BLE task awaits wait_done() instead of polling. States only move forward
+    until reset(). on_state(state) is called on every transition.
+    Create it after the session callbacks are set - it chains in front of them.
+    """
+    def __init__(self, session, on_state=None):
+        self.session = session
+        self.on_state = on_state
+        self._chain('on_stable', self._stable)
+        self._chain('on_ffb3_packet', self._ffb3_packet)
+        self._chain('on_complete', self._complete)
+        self.reset()
+
+    def _chain(self, name, hook):
+        original = getattr(self.session, name)
+
+        def chained(*args):
+            hook(*args)
+            if original:
+                original(*args)
+        setattr(self.session, name, chained)
+
+    def reset(self):
+        self.state = None
+        self.done = asyncio.Event()
+        self.disconnected = asyncio.Event()
+
+    def set_state(self, state):
+        if self.state is not None and STATES.index(state) <= STATES.index(self.state):
+            return
+        self.state = state
+        if self.on_state:
+            self.on_state(state)
+
+    def _stable(self, weight):
+        self.set_state(STABLE)
+        if self.session.ffb3_packets.total:
+            self.set_state(COMPOSITION)
+
+    def _ffb3_packet(self, packet_num):
+        # FFB3 packets may start before the weight settles; composition follows stable
+        if self.session.stable_weight is not None:
+            self.set_state(COMPOSITION)
+
+    def _complete(self):
+        self.set_state(DONE)
+        self.done.set()
+
+    def on_disconnected(self, client=None):
+        """Usable as BleakClient(disconnected_callback=...)."""
+        self.disconnected.set()
+
+    async def wait_done(self, timeout=None):
+        """
+        Waits for the complete result. Returns True when done, False when the link dropped first.
+        Raises asyncio.TimeoutError after `timeout` seconds.
+        """
+        if self.done.is_set():
+            return True
+        waiters = [asyncio.ensure_future(self.done.wait()), asyncio.ensure_future(self.disconnected.wait())]
+        try:
+            finished, _ = await asyncio.wait(waiters, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for waiter in waiters:
+                waiter.cancel()
+        if not finished:
+            raise asyncio.TimeoutError()
+        return self.done.is_set()
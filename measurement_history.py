@@ -0,0 +1,272 @@
+"""
+Local history of every measurement, stored in SQLite under data/ (WAL mode, indexed by time).
+Each stable weight gets a row with the scale MAC, the body composition once it is decoded and
+the Garmin upload status, which follows the upload queue results.
+
+    python measurement_history.py                  # last 20 measurements
+    python measurement_history.py --days 90 --by week
+    python measurement_history.py --audit          # upload status counts and unsent measurements
+"""
+import argparse
+import datetime
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+from app_config import no_log, shared_data_object
+
+HISTORY_FILE_NAME = 'measurement_history.sqlite'
+
+# dekodery.dekoduj_ffb3 keys -> columns, so composition can be aggregated without parsing JSON
+COMPOSITION_COLUMNS = {
+    'Fat %': 'fat',
+    'Water %': 'water',
+    'Muscle %': 'muscle',
+    'Bone %': 'bone',
+    'BMR (kcal)': 'bmr',
+    'BMI': 'bmi',
+    'Visceral fat': 'visceral_fat',
+    'Metabolic age': 'metabolic_age',
+}
+
+# upload_status: 'local' (never queued), 'pending', 'retrying' (last attempt failed), 'sent'
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS measurements (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts REAL NOT NULL,
+    measured_at TEXT NOT NULL,
+    mac TEXT,
+    weight REAL NOT NULL,
+    fat REAL, water REAL, muscle REAL, bone REAL, bmr REAL, bmi REAL, visceral_fat REAL, metabolic_age REAL,
+    composition TEXT,
+    ffb3_packet TEXT,
+    upload_status TEXT NOT NULL DEFAULT 'local',
+    upload_id INTEGER,
+    upload_weight REAL,
+    upload_attempts INTEGER NOT NULL DEFAULT 0,
+    uploaded_at TEXT
+);
+CREATE INDEX IF NOT EXISTS measurements_ts ON measurements (ts, weight);
+CREATE INDEX IF NOT EXISTS measurements_mac_ts ON measurements (mac, ts);
+CREATE INDEX IF NOT EXISTS measurements_upload ON measurements (upload_id);
+"""
+
+# strftime formats of the aggregate periods (local time)
+PERIODS = {
+    'day': '%Y-%m-%d',
+    'week': '%Y-W%W',
+    'month': '%Y-%m',
+}
+
+def _timestamp(value):
+    """Epoch seconds from a datetime, a date, an ISO string or a number (None stays None)."""
+    if value is None or isinstance(value, (int, float)):
+        return value
+    if isinstance(value, str):
+        value = datetime.datetime.fromisoformat(value)
+    if not isinstance(value, datetime.datetime):
+        value = datetime.datetime.combine(value, datetime.time())
+    return value.timestamp()
+
+class MeasurementHistory:
+    """
+    Measurement store. record() is called for every stable weight and returns the row id;
+    set_composition() and queue_upload() fill in the rest. attach_queue() keeps upload_status
+    in sync with an UploadQueue. Safe to use from several threads.
+    """
+    def __init__(self, db_path, log=None):
+        self.db_path = str(db_path)
+        self.log = log or no_log
+        self._lock = threading.Lock()
+        self._queues = set()
+        os.makedirs(os.path.dirname(self.db_path) or '.', exist_ok=True)
+        self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        with self._lock:
+            # WAL: readers (history queries) do not block the writer (new measurements, upload results)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            with self._db:
+                self._db.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    # --- writing -----------------------------------------------------------
+
+    def record(self, weight, mac=None, composition=None, ffb3_packet=None, measured_at=None):
+        """Stores a stable weight; returns the row id."""
+        measured_at = measured_at or datetime.datetime.now()
+        if isinstance(measured_at, str):
+            measured_at = datetime.datetime.fromisoformat(measured_at)
+        with self._lock, self._db:
+            cur = self._db.execute(
+                "INSERT INTO measurements (ts, measured_at, mac, weight) VALUES (?, ?, ?, ?)",
+                (measured_at.timestamp(), measured_at.isoformat(timespec='seconds'),
+                 mac.upper() if mac else None, float(weight)))
+        if composition or ffb3_packet:
+            self.set_composition(cur.lastrowid, composition, ffb3_packet)
+        return cur.lastrowid
+
+    def set_composition(self, measurement_id, composition, ffb3_packet=None):
+        """Adds the decoded body composition (dekoduj_ffb3 dict) and its raw FFB3 packet."""
+        composition = composition or {}
+        values = {column: composition.get(key) for key, column in COMPOSITION_COLUMNS.items()}
+        if isinstance(ffb3_packet, (bytes, bytearray)):
+            ffb3_packet = ffb3_packet.hex()
+        assignments = ", ".join(f"{column} = ?" for column in values)
+        with self._lock, self._db:
+            self._db.execute(
+                f"UPDATE measurements SET {assignments}, composition = ?, ffb3_packet = ? WHERE id = ?",
+                (*values.values(), json.dumps(composition) if composition else None, ffb3_packet, measurement_id))
+
+    def mark_queued(self, measurement_id, upload_id, weight=None):
+        """Links a measurement to its upload queue entry (`weight` when the user corrected it)."""
+        with self._lock, self._db:
+            self._mark_queued(measurement_id, upload_id, weight)
+
+    def queue_upload(self, measurement_id, queue, weight, upload_weight=None, **kwargs):
+        """
+        Enqueues `weight` on `queue` (kwargs go to UploadQueue.enqueue) and links the row to the
+        new entry before any upload result can be applied to it. Returns the entry id.
+        `upload_weight` is the user-corrected weight, if any.
+        """
+        self.attach_queue(queue)
+        try:
+            # apply_upload_results waits for this lock, so the worker cannot overtake the link
+            with self._lock:
+                entry_id = queue.enqueue(weight, wake=False, **kwargs)
+                try:
+                    with self._db:
+                        self._mark_queued(measurement_id, entry_id, upload_weight)
+                except sqlite3.Error as e:
+                    self.log(f"Measurement history error: {e}", "ERROR")
+        finally:
+            queue.wake()
+        return entry_id
+
+    def _mark_queued(self, measurement_id, upload_id, weight):
+        self._db.execute(
+            "UPDATE measurements SET upload_status = 'pending', upload_id = ?, upload_weight = ? WHERE id = ?",
+            (upload_id, weight, measurement_id))
+
+    def apply_upload_results(self, results, pending=None):
+        """UploadQueue listener: results is a list of (outbox entry, ok); entries carry the updated attempt count."""
+        now = datetime.datetime.now().isoformat(timespec='seconds')
+        with self._lock, self._db:
+            for entry, ok in results:
+                if ok:
+                    self._db.execute(
+                        "UPDATE measurements SET upload_status = 'sent', uploaded_at = ?, upload_attempts = ? "
+                        "WHERE upload_id = ?", (now, entry['attempts'], entry['id']))
+                elif entry['attempts']:
+                    # entries the sender never reached keep their status
+                    self._db.execute(
+                        "UPDATE measurements SET upload_status = 'retrying', upload_attempts = ? WHERE upload_id = ?",
+                        (entry['attempts'], entry['id']))
+
+    def attach_queue(self, queue):
+        """Follows the upload results of `queue` (once per queue)."""
+        with self._lock:
+            if id(queue) in self._queues:
+                return
+            self._queues.add(id(queue))
+        queue.subscribe(self.apply_upload_results)
+
+    # --- queries -----------------------------------------------------------
+
+    def measurements(self, start=None, end=None, mac=None, limit=None, newest_first=True):
+        """Measurements with start <= time < end (datetimes, dates, ISO strings or epoch seconds)."""
+        where, params = self._range(start, end, mac)
+        sql = f"SELECT * FROM measurements{where} ORDER BY ts {'DESC' if newest_first else 'ASC'}"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+        with self._lock:
+            rows = self._db.execute(sql, params).fetchall()
+        return [self._measurement(row) for row in rows]
+
+    def latest(self, mac=None):
+        rows = self.measurements(mac=mac, limit=1)
+        return rows[0] if rows else None
+
+    def aggregate(self, period='day', start=None, end=None, mac=None):
+        """Per day/week/month: count, average/min/max weight and average fat % and BMI."""
+        fmt = PERIODS[period]
+        where, params = self._range(start, end, mac)
+        sql = (f"SELECT strftime('{fmt}', ts, 'unixepoch', 'localtime') AS period, COUNT(*) AS count, "
+               "AVG(weight) AS avg_weight, MIN(weight) AS min_weight, MAX(weight) AS max_weight, "
+               "AVG(fat) AS avg_fat, AVG(bmi) AS avg_bmi, MIN(ts) AS first_ts "
+               f"FROM measurements{where} GROUP BY period ORDER BY first_ts")
+        with self._lock:
+            rows = self._db.execute(sql, params).fetchall()
+        return [{key: row[key] for key in row.keys() if key != 'first_ts'} for row in rows]
+
+    def upload_audit(self, start=None, end=None):
+        """{'counts': {status: n}, 'unsent': measurements not confirmed as sent, oldest first}."""
+        where, params = self._range(start, end)
+        with self._lock:
+            counts = dict(self._db.execute(
+                f"SELECT upload_status, COUNT(*) FROM measurements{where} GROUP BY upload_status", params).fetchall())
+            condition = f"{where} AND" if where else " WHERE"
+            unsent = self._db.execute(
+                f"SELECT * FROM measurements{condition} upload_status != 'sent' ORDER BY ts", params).fetchall()
+        return {'counts': counts, 'unsent': [self._measurement(row) for row in unsent]}
+
+    def _range(self, start=None, end=None, mac=None):
+        clauses, params = [], []
+        if start is not None:
+            clauses.append("ts >= ?")
+            params.append(_timestamp(start))
+        if end is not None:
+            clauses.append("ts < ?")
+            params.append(_timestamp(end))
+        if mac:
+            clauses.append("mac = ?")
+            params.append(mac.upper())
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+    def _measurement(self, row):
+        entry = dict(row)
+        entry['composition'] = json.loads(row['composition']) if row['composition'] else None
+        return entry
+
+def get_measurement_history(ini_path, log=None):
+    """Returns the shared MeasurementHistory of the app that owns `ini_path`."""
+    return shared_data_object(ini_path, HISTORY_FILE_NAME, lambda path: MeasurementHistory(path, log=log))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Show the local FiToGar measurement history.")
+    parser.add_argument('--ini', default=None, help="waga.ini path (default: config/waga.ini)")
+    parser.add_argument('--days', type=int, default=None, help="only the last N days")
+    parser.add_argument('--mac', default=None, help="only this scale")
+    parser.add_argument('--by', choices=sorted(PERIODS), help="aggregate per day, week or month")
+    parser.add_argument('--audit', action='store_true', help="upload status summary")
+    parser.add_argument('-n', '--limit', type=int, default=20)
+    args = parser.parse_args(argv)
+
+    from app_config import get_config
+    history = get_measurement_history(get_config(args.ini).ini_path)
+    start = time.time() - args.days * 86400 if args.days else None
+
+    if args.audit:
+        audit = history.upload_audit(start)
+        print(", ".join(f"{status}: {count}" for status, count in sorted(audit['counts'].items())) or "No measurements.")
+        for m in audit['unsent']:
+            print(f"{m['measured_at']}  {m['weight']:7.2f} kg  {m['upload_status']} (attempts {m['upload_attempts']})")
+    elif args.by:
+        for row in history.aggregate(args.by, start, mac=args.mac):
+            fat = f"  fat {row['avg_fat']:.1f} %" if row['avg_fat'] is not None else ""
+            print(f"{row['period']:10}  n={row['count']:<3} avg {row['avg_weight']:.2f}  "
+                  f"min {row['min_weight']:.2f}  max {row['max_weight']:.2f} kg{fat}")
+    else:
+        for m in history.measurements(start, mac=args.mac, limit=args.limit):
+            print(f"{m['measured_at']}  {m['mac'] or '-':17}  {m['weight']:7.2f} kg  {m['upload_status']}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
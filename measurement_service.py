@@ -0,0 +1,400 @@
+"""
+Headless measurement of the configured scale, without Kivy.
+MeasurementService runs the whole BLE flow (passive advertisements, pre-scan, cached
+device profile, FFB2/FFB3 notifications, packet capture) and reports progress as
+(event, data) pairs to subscribers or through the async iterator events().
+WeighScreen is one subscriber; the CLI below is another:
+
+    python measurement_service.py                  # one measurement, print the result
+    python measurement_service.py --forever --upload
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import sys
+from pathlib import Path
+
+import advertisement
+import dekodery
+from app_config import get_config
+from ble_scanner import find_device, DeviceMatcher, StreamingScanner
+from device_profiles import get_device_profiles, service_uuids, subscribe_cached, StaleProfileError
+from measurement_history import get_measurement_history
+from measurement import (MeasurementSession, MeasurementFlow, FFB2_WEIGHT_UUID, FFB3_BODY_COMP_UUID,
+                         MIN_STABLE_COUNT, CONNECTING, STREAMING)
+from packet_capture import PacketCapture
+
+BASE_DIR = Path(__file__).parent
+LOG_DIR = BASE_DIR / "src" / "app" / "data" / "log"
+PRESCAN_TIMEOUT = 10.0  # seconds to look for the stored MAC before connecting by address
+
+# Events: 'status' text, 'state' name, 'weight' (weight, counter, is_stable), 'stable' weight,
+# 'ffb3_packet' number, 'analysis' (packet, results), 'complete' session, 'finished' end status
+EVENTS = ('status', 'state', 'weight', 'stable', 'ffb3_packet', 'analysis', 'complete', 'finished')
+
+class _EventStream:
+    """Async iterator over service events; ends after the 'finished' event."""
+    def __init__(self, service):
+        self.service = service
+        self.queue = asyncio.Queue()
+        service._streams.append(self.queue)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.queue is None:
+            raise StopAsyncIteration
+        event, data = await self.queue.get()
+        if event == 'finished':
+            self.close()
+        return event, data
+
+    def close(self):
+        if self.queue is not None and self.queue in self.service._streams:
+            self.service._streams.remove(self.queue)
+        self.queue = None
+
+class MeasurementService:
+    """
+    One measurement at a time for the scale in [URZADZENIE].
+    Listeners are called as listener(event, data) on the asyncio loop thread.
+    `client_factory` is bleak's BleakClient by default.
+    """
+    def __init__(self, ini_path=None, log=None, client_factory=None, log_dir=LOG_DIR):
+        self.config = get_config(ini_path)
+        self.ini_path = self.config.ini_path
+        self.log = log or self._default_log
+        self.client_factory = client_factory
+        self.log_dir = Path(log_dir)
+        self.listeners = []
+        self._streams = []
+        self.task = None
+        self.end_status = None
+        self.device = {}
+        self.passive_mode = False
+        self.capture = None
+        self.capture_path = None
+        self.binary_capture = False
+        self.history_id = None
+
+        self.session = MeasurementSession(MIN_STABLE_COUNT, log=self.log, log_packet=self.log_packet)
+        self.session.on_weight = lambda weight, counter, is_stable: self.emit('weight', (weight, counter, is_stable))
+        self.session.on_stable = self._on_stable
+        self.session.on_ffb3_packet = lambda packet_num: self.emit('ffb3_packet', packet_num)
+        self.session.on_analysis = lambda packet, results: self.emit('analysis', (packet, results))
+        self.session.on_complete = self._on_complete
+        self.flow = MeasurementFlow(self.session, on_state=lambda state: self.emit('state', state))
+
+    def _default_log(self, message, level="INFO"):
+        dekodery.loguj(message, dopisek=f"MeasurementService [{level}]", ini_path=self.ini_path)
+
+    # --- events ------------------------------------------------------------
+
+    def subscribe(self, listener):
+        if listener not in self.listeners:
+            self.listeners.append(listener)
+
+    def unsubscribe(self, listener):
+        if listener in self.listeners:
+            self.listeners.remove(listener)
+
+    def events(self):
+        """Async iterator of (event, data) until the current measurement finishes."""
+        return _EventStream(self)
+
+    def emit(self, event, data=None):
+        for listener in list(self.listeners):
+            try:
+                listener(event, data)
+            except Exception as e:
+                self.log(f"Measurement listener error ({event}): {e}", "ERROR")
+        for queue in list(self._streams):
+            queue.put_nowait((event, data))
+
+    def set_status(self, text):
+        self.emit('status', text)
+
+    # --- history -----------------------------------------------------------
+
+    def _on_stable(self, weight):
+        try:
+            history = get_measurement_history(self.ini_path, log=self.log)
+            self.history_id = history.record(weight, mac=self.device.get('mac_address'))
+        except Exception as e:
+            self.log(f"Measurement history error: {e}", "ERROR")
+        self.emit('stable', weight)
+
+    def _on_complete(self):
+        if self.history_id is not None and self.session.analysis:
+            try:
+                get_measurement_history(self.ini_path, log=self.log).set_composition(
+                    self.history_id, self.session.analysis, self.session.stable_ffb3_packet)
+            except Exception as e:
+                self.log(f"Measurement history error: {e}", "ERROR")
+        self.emit('complete', self.session)
+
+    # --- control -----------------------------------------------------------
+
+    @property
+    def is_running(self):
+        return self.task is not None and not self.task.done()
+
+    def prepare(self):
+        """
+        Reads the current settings and resets the session for a new measurement.
+        Returns False (with a 'status' event) when no scale is configured.
+        """
+        config = self.config
+        self.device = config.device
+        if not self.device.get('mac_address'):
+            self.set_status("Error: Set MAC address!")
+            return False
+        self.passive_mode = config.passive_adv
+        self.session.set_min_stable(config.adv_min_stable if self.passive_mode else MIN_STABLE_COUNT)
+        self.session.adv_offset = config.adv_offset
+        self.session.require_composition = not self.passive_mode or config.adv_composition
+        self.session.reset()
+        self.flow.reset()
+        self.end_status = None
+        self.history_id = None
+
+        # 🧾 BLE capture path based on MAC
+        self.close_capture()
+        self.log_dir.mkdir(parents=True, exist_ok=True)
+        mac_clean = self.device['mac_address'].replace(":", "").lower()
+        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        self.binary_capture = config.ble_log_format == 'binary'
+        self.capture_path = self.log_dir / f"ble_{mac_clean}_{timestamp}.{'bin' if self.binary_capture else 'log'}"
+        self.log(f"📁 Current BLE log: {self.capture_path}")
+        return True
+
+    def start(self):
+        """Starts measure() as a task on the running loop (call prepare() first)."""
+        if not self.is_running:
+            self.task = asyncio.create_task(self.measure())
+        return self.task
+
+    def stop(self):
+        if self.is_running:
+            self.task.cancel()
+
+    def upload(self, weight=None, on_result=None):
+        """
+        Queues the result (or a user-corrected `weight`) for Garmin. Returns the outbox entry id.
+        on_result(entry, ok, pending_count) is called from the upload worker with this entry's result.
+        """
+        import upload_queue
+        queue = upload_queue.get_upload_queue(self.ini_path, log=self.log)
+        kwargs = dict(composition=self.session.analysis, ffb3_packet=self.session.stable_ffb3_packet,
+                      on_result=on_result)
+        upload_weight = self.session.stable_weight if weight is None else weight
+        history = None
+        if self.history_id is not None:
+            try:
+                history = get_measurement_history(self.ini_path, log=self.log)
+            except Exception as e:
+                self.log(f"Measurement history error: {e}", "ERROR")
+        if history:
+            return history.queue_upload(self.history_id, queue, upload_weight, upload_weight=weight, **kwargs)
+        return queue.enqueue(upload_weight, **kwargs)
+
+    # --- packet capture ----------------------------------------------------
+
+    def log_packet(self, label, packet):
+        try:
+            if self.capture is None:
+                self.capture = PacketCapture(self.capture_path, binary=self.binary_capture)
+            self.capture.write(label, packet)
+        except Exception as e:
+            self.log(f"BLE packet write error: {e}", "ERROR")
+
+    def close_capture(self):
+        """Closes the session capture file so buffered packets reach the disk."""
+        if self.capture:
+            try:
+                self.capture.close()
+            except Exception as e:
+                self.log(f"BLE packet capture close error: {e}", "ERROR")
+            self.capture = None
+
+    # --- measurement -------------------------------------------------------
+
+    def _client(self, target, **kwargs):
+        factory = self.client_factory
+        if factory is None:
+            from bleak import BleakClient
+            factory = BleakClient
+        return factory(target, timeout=15.0, disconnected_callback=self.flow.on_disconnected, **kwargs)
+
+    async def measure(self):
+        """Runs one measurement and returns the session. Emits 'finished' with the end status at the end."""
+        mac = self.device.get('mac_address')
+        firmware = self.device.get('firmware_rev')
+        profiles = get_device_profiles(self.ini_path, log=self.log)
+        handlers = {FFB2_WEIGHT_UUID: self.session.handle_ffb2_notification,
+                    FFB3_BODY_COMP_UUID: self.session.handle_ffb3_notification}
+        self.flow.set_state(CONNECTING)
+        try:
+            device = None
+            if self.passive_mode:
+                device = await self.passive_weight_capture(mac, self.config.ble_listen_time)
+                if self.session.is_complete:
+                    self.end_status = "Measurement complete."
+                    return self.session  # weight-only measurement, no connection needed
+                if self.session.stable_weight is None:
+                    self.log("No weight in advertisements, switching to the connected FFB2/FFB3 path.", "WARNING")
+                    self.session.set_min_stable(MIN_STABLE_COUNT)
+                else:
+                    self.set_status("Weight captured, connecting for body composition...")
+
+            if device is None:
+                # Short streaming pre-scan: stops on the first advertisement from the stored MAC
+                self.set_status("Looking for the scale...")
+                device = await find_device(mac=mac, timeout=PRESCAN_TIMEOUT)
+            if device is None:
+                self.log(f"{mac} not seen during the pre-scan, connecting by address.", "WARNING")
+            target = device or mac
+            self.log(f"Attempting to connect to {mac}...")
+
+            # Known scale: discover only the measurement service and subscribe by cached handle
+            profile = profiles.get(mac, firmware)
+            if profile:
+                try:
+                    services = service_uuids(profile, handlers)
+                except KeyError as e:
+                    self.log(f"Cached device profile lacks {e}, running full discovery.", "WARNING")
+                    profiles.invalidate(mac, firmware)
+                    profile = None
+            if profile:
+                try:
+                    async with self._client(target, services=services) as client:
+                        if client.is_connected:
+                            await subscribe_cached(client, profile, handlers)
+                            self.log("Subscribed using the cached device profile.")
+                            await self.listen_for_measurement(client)
+                    return self.session
+                except StaleProfileError as e:
+                    self.log(f"Cached device profile is stale ({e}), running full discovery.", "WARNING")
+                    profiles.invalidate(mac, firmware)
+
+            async with self._client(target) as client:
+                if client.is_connected:
+                    for uuid, callback in handlers.items():
+                        await client.start_notify(uuid, callback)
+                    profiles.put(mac, firmware, client.services)
+                    await self.listen_for_measurement(client)
+            return self.session
+        except asyncio.CancelledError:
+            self.log("Measurement task was cancelled.")
+            raise
+        except Exception as e:
+            self.end_status = f"BLE error: {e}"; self.log(f"BLE error: {e}", "ERROR")
+            return self.session
+        finally:
+            self.close_capture()
+            self.emit('finished', self.end_status)
+
+    async def passive_weight_capture(self, mac, timeout):
+        """
+        Decodes the weight from the scale's advertisements, without connecting.
+        Returns the scale's BLEDevice (None if it was not seen) once the weight is stable or after `timeout`.
+        """
+        self.set_status("Listening to scale advertisements...")
+        self.flow.set_state(STREAMING)
+        self.log(f"Passive advertisement capture for {mac} (offset {self.session.adv_offset}).")
+
+        def on_advertisement(device, adv):
+            if (device.address or '').upper() != mac.upper():
+                return
+            for frame in advertisement.manufacturer_frames(adv):
+                self.session.handle_adv_frame(frame)
+            if self.session.stable_weight is not None:
+                scanner.finish()
+
+        scanner = StreamingScanner(match=DeviceMatcher(mac), on_advertisement=on_advertisement)
+        return await scanner.run(timeout, stop_on_match=False)
+
+    async def listen_for_measurement(self, client):
+        """
+        Waits - without polling - until the result is complete, the scale disconnects or
+        czas_nasluchu_ble runs out. With przerwij_po_pakiecie the link is closed right after the result.
+        """
+        self.flow.set_state(STREAMING)
+        self.set_status("Measurement started")
+        timeout = self.config.ble_listen_time or None
+        try:
+            finished = await self.flow.wait_done(timeout)
+        except asyncio.TimeoutError:
+            self.end_status = f"No complete result within {timeout} s."
+            self.log(self.end_status, "WARNING")
+            return
+        if not finished:
+            self.end_status = "Scale disconnected."
+            self.log("Scale disconnected before the result was complete.", "WARNING")
+            return
+        if self.config.stop_after_packet:
+            self.end_status = "Measurement complete."
+            self.log("Result complete, disconnecting (przerwij_po_pakiecie).")
+            return
+        # Stay connected until the measurement is stopped or the scale goes to sleep
+        await self.flow.disconnected.wait()
+        self.end_status = "Measurement complete."
+
+def _result(session):
+    return {
+        'measured_at': datetime.datetime.now().isoformat(timespec='seconds'),
+        'weight': session.stable_weight,
+        'composition': session.analysis,
+    }
+
+async def _run_cli(args):
+    log = (lambda message, level="INFO": print(f"[{level}] {message}")) if args.verbose else None
+    service = MeasurementService(args.ini, log=log)
+    done = 0
+    while args.forever or done < args.count:
+        if not service.prepare():
+            print("No scale configured ([URZADZENIE] mac_address).")
+            return 1
+        stream = service.events()
+        service.start()
+        async for event, data in stream:
+            if event == 'status':
+                print(data)
+            elif event == 'stable':
+                print(f"Stable weight: {data:.2f} kg")
+            elif event == 'finished' and data:
+                print(data)
+        session = service.session
+        if session.is_complete:
+            done += 1
+            print(json.dumps(_result(session), ensure_ascii=False) if args.json else
+                  f"Result: {session.stable_weight:.2f} kg {session.analysis or ''}")
+            if args.upload:
+                entry_id = service.upload()
+                print(f"Queued for upload (entry #{entry_id}).")
+        elif not args.forever:
+            return 1
+    return 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless FiToGar measurement (no GUI).")
+    parser.add_argument('--ini', default=None, help="waga.ini path (default: config/waga.ini)")
+    parser.add_argument('-n', '--count', type=int, default=1, help="number of measurements")
+    parser.add_argument('--forever', action='store_true', help="keep measuring (daemon mode)")
+    parser.add_argument('--upload', action='store_true', help="queue every result for Garmin upload")
+    parser.add_argument('--json', action='store_true', help="print results as JSON lines")
+    parser.add_argument('-v', '--verbose', action='store_true', help="print the log instead of writing it to the log file")
+    args = parser.parse_args(argv)
+    try:
+        return asyncio.run(_run_cli(args))
+    except KeyboardInterrupt:
+        return 0
+    finally:
+        import upload_queue
+        upload_queue.stop_upload_queues()
+        dekodery.flush_logs()
+
+if __name__ == '__main__':
+    sys.exit(main())
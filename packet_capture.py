@@ -0,0 +1,95 @@
+import struct
+import time
+
+# Binary capture: magic header, then records of (timestamp, characteristic id, length) + raw bytes
+CAPTURE_MAGIC = b'FTGCAP1\n'
+RECORD_HEADER = struct.Struct('<dBH')
+CHARACTERISTIC_IDS = {'FFB2': 2, 'FFB3': 3, 'ADV': 4}  # ADV = advertisement manufacturer data
+CHARACTERISTIC_LABELS = {v: k for k, v in CHARACTERISTIC_IDS.items()}
+
+class PacketCapture:
+    """
+    Writer for BLE packet captures, keeping one open handle per measurement session.
+    Text mode writes the classic '[FFB2] <hex>' lines, binary mode writes compact
+    timestamped records that read_capture() and export_text() understand.
+    """
+    def __init__(self, path, binary=False, buffering=64 * 1024):
+        self.path = path
+        self.binary = binary
+        self.buffering = buffering
+        self.count = 0
+        self._file = None
+
+    def open(self):
+        if self._file is None:
+            if self.binary:
+                self._file = open(self.path, 'ab', buffering=self.buffering)
+                if self._file.tell() == 0:
+                    self._file.write(CAPTURE_MAGIC)
+            else:
+                self._file = open(self.path, 'a', encoding='utf-8', buffering=self.buffering)
+        return self
+
+    def write(self, label, data, timestamp=None):
+        """Appends one packet. `label` is the characteristic name, e.g. 'FFB2'."""
+        f = self._file or self.open()._file
+        if self.binary:
+            ts = time.time() if timestamp is None else timestamp
+            f.write(RECORD_HEADER.pack(ts, CHARACTERISTIC_IDS.get(label, 0), len(data)) + bytes(data))
+        else:
+            f.write(f"[{label}] {data.hex()}\n")
+        self.count += 1
+
+    def flush(self):
+        if self._file:
+            self._file.flush()
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *exc):
+        self.close()
+
+def is_binary_capture(path):
+    with open(path, 'rb') as f:
+        return f.read(len(CAPTURE_MAGIC)) == CAPTURE_MAGIC
+
+def read_capture(path):
+    """Yields (timestamp or None, label, bytes) from a text or binary capture file."""
+    if is_binary_capture(path):
+        with open(path, 'rb') as f:
+            f.read(len(CAPTURE_MAGIC))
+            while True:
+                header = f.read(RECORD_HEADER.size)
+                if len(header) < RECORD_HEADER.size:
+                    return
+                ts, char_id, length = RECORD_HEADER.unpack(header)
+                data = f.read(length)
+                if len(data) < length:
+                    return # truncated last record
+                yield ts, CHARACTERISTIC_LABELS.get(char_id, f"ID{char_id}"), data
+    else:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line.startswith('[') or ']' not in line:
+                    continue
+                label, _, hex_data = line[1:].partition(']')
+                try:
+                    yield None, label, bytes.fromhex(hex_data.strip())
+                except ValueError:
+                    continue
+
+def export_text(path, out_path):
+    """Converts any capture to the text '[FFB2] <hex>' format. Returns the number of packets."""
+    count = 0
+    with PacketCapture(out_path) as out:
+        for ts, label, data in read_capture(path):
+            out.write(label, data)
+            count += 1
+    return count
@@ -0,0 +1,90 @@
+"""
+Offline replay of recorded BLE sessions (ble_*.log / ble_*.bin).
+Streams a capture through the same MeasurementSession handlers used by WeighScreen,
+without Kivy and without Bluetooth. [ADV] lines (passive advertisement captures) are
+decoded like FFB2 packets, see advertisement.py.
+
+    python replay.py src/app/data/log/ble_c57530bb360e_20250703_130826.log --speed 10
+"""
+import argparse
+import sys
+import time
+
+from measurement import MeasurementSession, FFB2_WEIGHT_UUID, FFB3_BODY_COMP_UUID, MIN_STABLE_COUNT
+from packet_capture import read_capture
+
+DEFAULT_INTERVAL = 0.1  # text captures have no timestamps - assume a 10 Hz notification stream
+
+def replay(path, session=None, speed=1.0, interval=DEFAULT_INTERVAL, sleep=time.sleep):
+    """
+    Feeds every packet of a capture into `session`.
+    speed=1.0 is real time, speed=N is N times faster, speed=None or 0 means as fast as possible.
+    Returns a dict with packet counts and throughput.
+    """
+    session = session or MeasurementSession()
+    handlers = {
+        'FFB2': (FFB2_WEIGHT_UUID, session.handle_ffb2_notification),
+        'FFB3': (FFB3_BODY_COMP_UUID, session.handle_ffb3_notification),
+    }
+    handlers['ADV'] = (None, lambda sender, data: session.handle_adv_frame(data))
+    counts = {}
+    decode_time = 0.0
+    previous_ts = None
+    started = time.perf_counter()
+
+    for ts, label, data in read_capture(path):
+        if speed:
+            if ts is not None and previous_ts is not None:
+                delay = max(0.0, ts - previous_ts)
+            else:
+                delay = interval if previous_ts is not None else 0.0
+            if delay:
+                sleep(delay / speed)
+            previous_ts = ts if ts is not None else 0.0
+
+        handler = handlers.get(label)
+        if handler is None:
+            continue
+        sender, handle = handler
+        t0 = time.perf_counter()
+        handle(sender, bytearray(data))
+        decode_time += time.perf_counter() - t0
+        counts[label] = counts.get(label, 0) + 1
+
+    total = sum(counts.values())
+    return {
+        'packets': counts,
+        'elapsed_s': time.perf_counter() - started,
+        'decode_s': decode_time,
+        'packets_per_s': total / decode_time if decode_time else 0.0,
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a recorded FiToGar BLE capture through the decoders.")
+    parser.add_argument('capture', help="ble_*.log or ble_*.bin capture file")
+    pacing = parser.add_mutually_exclusive_group()
+    pacing.add_argument('--speed', type=float, default=1.0, help="pacing multiplier (1 = real time)")
+    pacing.add_argument('--fast', action='store_true', help="replay as fast as possible")
+    parser.add_argument('--interval', type=float, default=DEFAULT_INTERVAL,
+                        help="packet interval in seconds for text captures without timestamps")
+    parser.add_argument('--min-stable', type=int, default=MIN_STABLE_COUNT)
+    parser.add_argument('--adv-offset', type=int, default=0,
+                        help="offset of the weight packet inside [ADV] advertisement frames")
+    parser.add_argument('-v', '--verbose', action='store_true', help="print every weight update")
+    args = parser.parse_args(argv)
+
+    session = MeasurementSession(args.min_stable)
+    session.adv_offset = args.adv_offset
+    if args.verbose:
+        session.on_weight = lambda w, c, s: print(f"weight={w:.2f} kg stability={c}/{args.min_stable} stable={s}")
+    session.on_stable = lambda w: print(f"Stable weight: {w:.2f} kg")
+    session.on_analysis = lambda packet, results: print(f"Body analysis: {results}")
+    session.on_complete = lambda: print("Measurement complete.")
+
+    stats = replay(args.capture, session, speed=0 if args.fast else args.speed, interval=args.interval)
+    print(f"Packets: {stats['packets']}, elapsed {stats['elapsed_s']:.3f} s, "
+          f"decode {stats['decode_s'] * 1000:.2f} ms ({stats['packets_per_s']:.0f} packets/s)")
+    return 0 if session.stable_weight is not None else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
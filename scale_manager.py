@@ -0,0 +1,301 @@
+"""
+Several scales measured concurrently from one host (e.g. a gym with N scales).
+One asyncio task per configured scale keeps a connection open, feeds its own
+MeasurementSession (packet rings + stability tracker), records every finished
+measurement in the measurement history and hands it to a shared sink, by default
+the durable upload queue.
+
+    python scale_manager.py                       # scales from config/waga.ini
+    python scale_manager.py --simulate ble.log -n 20 --no-upload
+    python scale_manager.py --passive             # weight from advertisements, one scan for all scales
+"""
+import argparse
+import asyncio
+import sys
+
+from advertisement import AdvertisementWeightReader
+from app_config import no_log
+from ble_scanner import StreamingScanner
+from measurement import (MeasurementSession, MeasurementFlow, FFB2_WEIGHT_UUID, FFB3_BODY_COMP_UUID,
+                         MIN_STABLE_COUNT, CONNECTING, STREAMING)
+from packet_capture import read_capture
+
+CONNECT_CONCURRENCY = 3   # parallel connection setups (adapters handle only a few at a time)
+RECONNECT_DELAY = 5.0
+
+def bleak_backend(device, disconnected_callback=None):
+    """Default backend: a BleakClient for the configured MAC."""
+    from bleak import BleakClient
+    return BleakClient(device['mac_address'], timeout=15.0, disconnected_callback=disconnected_callback)
+
+class SimulatedClient:
+    """
+    Stand-in for BleakClient that replays a recorded capture into the subscribed handlers.
+    Supports connect()/disconnect() and `async with` like the real client; repeats the capture `repeat` times.
+    """
+    def __init__(self, packets, interval=0.1, repeat=1, disconnected_callback=None):
+        self.packets = packets
+        self.disconnected_callback = disconnected_callback
+        self.interval = interval
+        self.repeat = repeat
+        self.is_connected = False
+        self.callbacks = {}
+        self._task = None
+
+    async def connect(self):
+        self.is_connected = True
+        return True
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.disconnect()
+
+    async def disconnect(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        if self.is_connected:
+            self.is_connected = False
+            if self.disconnected_callback:
+                self.disconnected_callback(self)
+
+    async def start_notify(self, uuid, callback):
+        self.callbacks[str(uuid).lower()] = callback
+        if self._task is None:
+            self._task = asyncio.create_task(self._feed())
+
+    async def _feed(self):
+        uuids = {'FFB2': FFB2_WEIGHT_UUID, 'FFB3': FFB3_BODY_COMP_UUID}
+        for _ in range(self.repeat):
+            for label, data in self.packets:
+                await asyncio.sleep(self.interval)
+                callback = self.callbacks.get(uuids.get(label))
+                if callback:
+                    callback(uuids[label], bytearray(data))
+
+def simulated_backend(capture_path, interval=0.1, repeat=1):
+    """Backend whose every scale replays `capture_path` (read once, shared by all clients)."""
+    packets = [(label, data) for ts, label, data in read_capture(capture_path)]
+    return lambda device, disconnected_callback=None: SimulatedClient(
+        packets, interval=interval, repeat=repeat, disconnected_callback=disconnected_callback)
+
+def upload_sink(ini_path, log=None, history=None):
+    """
+    Routes finished measurements into the shared upload queue. With `history`, rows recorded
+    by ScaleManager are linked to their queue entries.
+    """
+    import upload_queue
+    queue = upload_queue.get_upload_queue(ini_path, log=log)
+
+    def sink(device, session):
+        kwargs = dict(composition=session.analysis, ffb3_packet=session.stable_ffb3_packet)
+        if history and session.history_id is not None:
+            history.queue_upload(session.history_id, queue, session.stable_weight, **kwargs)
+        else:
+            queue.enqueue(session.stable_weight, **kwargs)
+    return sink
+
+class ScaleManager:
+    """
+    Keeps one connection task per scale. `devices` are dicts with at least 'mac_address'
+    (AppConfig.devices). Every completed measurement is passed to on_measurement(device, session);
+    the session is then reset and the scale keeps listening for the next person.
+    `backend(device, disconnected_callback)` returns a BleakClient-like object (connect, start_notify, disconnect).
+    With passive=True nothing connects: one StreamingScanner (`scanner_factory`, BleakScanner by
+    default) feeds the advertisements of all scales to their sessions (weight only).
+    """
+    def __init__(self, devices, on_measurement, backend=bleak_backend, min_stable=MIN_STABLE_COUNT,
+                 require_composition=True, connect_concurrency=CONNECT_CONCURRENCY,
+                 reconnect_delay=RECONNECT_DELAY, history=None, passive=False, adv_offset=0,
+                 company_id=None, scanner_factory=None, log=None):
+        self.devices = list(devices)
+        self.on_measurement = on_measurement
+        self.history = history
+        self.backend = backend
+        self.passive = passive
+        self.adv_offset = adv_offset
+        self.company_id = company_id
+        self.scanner_factory = scanner_factory
+        self.min_stable = min_stable
+        self.require_composition = require_composition
+        self.connect_concurrency = connect_concurrency
+        self.reconnect_delay = reconnect_delay
+        self.log = log or no_log
+        self.sessions = {}
+        self.flows = {}
+        self.counts = {}
+        self._tasks = {}
+        self._scan_task = None
+        self._connect_slots = None
+
+    def start(self):
+        """Starts a task per scale (call from a running event loop)."""
+        self._connect_slots = asyncio.Semaphore(max(1, self.connect_concurrency))
+        for device in self.devices:
+            mac = device['mac_address'].upper()
+            if mac not in self._tasks or self._tasks[mac].done():
+                run = self._run_passive_device if self.passive else self._run_device
+                self._tasks[mac] = asyncio.create_task(run(device), name=f"scale-{mac}")
+        if self.passive and (self._scan_task is None or self._scan_task.done()):
+            self._scan_task = asyncio.create_task(self._scan(), name="scale-scan")
+
+    async def stop(self):
+        tasks = list(self._tasks.values())
+        if self._scan_task:
+            tasks.append(self._scan_task)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks.clear()
+        self._scan_task = None
+
+    async def run(self, duration=None):
+        """Runs all scales for `duration` seconds (None = until cancelled)."""
+        self.start()
+        try:
+            if duration is None:
+                await asyncio.gather(*self._tasks.values())
+            else:
+                await asyncio.sleep(duration)
+        finally:
+            await self.stop()
+
+    def status(self):
+        """{mac: (state, finished measurements)} for every scale."""
+        return {mac: (self.flows[mac].state if mac in self.flows else None, self.counts.get(mac, 0))
+                for mac in self._tasks}
+
+    def _new_session(self, device):
+        mac = device['mac_address'].upper()
+        name = device.get('name') or mac
+        session = MeasurementSession(self.min_stable, log=lambda message, level="INFO": self.log(f"[{name}] {message}", level))
+        session.require_composition = self.require_composition and not self.passive
+        session.adv_offset = self.adv_offset
+        self.sessions[mac] = session
+        flow = self.flows[mac] = MeasurementFlow(session)
+        return session, flow
+
+    async def _run_device(self, device):
+        mac = device['mac_address'].upper()
+        session, flow = self._new_session(device)
+        while True:
+            try:
+                flow.reset()
+                flow.set_state(CONNECTING)
+                client = self.backend(device, disconnected_callback=flow.on_disconnected)
+                async with self._connect_slots:
+                    await client.connect()
+                try:
+                    await client.start_notify(FFB2_WEIGHT_UUID, session.handle_ffb2_notification)
+                    await client.start_notify(FFB3_BODY_COMP_UUID, session.handle_ffb3_notification)
+                    flow.set_state(STREAMING)
+                    # Event-driven: wake up only on a finished result or a dropped link
+                    while await flow.wait_done():
+                        self._finish(device, session)
+                        # Re-arm only after step-off: the same person keeps sending the same weight
+                        session.reset(hold_weight=session.stable_weight)
+                        disconnected = flow.disconnected.is_set()
+                        flow.reset()
+                        if disconnected:
+                            break
+                        flow.set_state(STREAMING)
+                finally:
+                    await client.disconnect()
+                self.log(f"{mac} disconnected.", "WARNING")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.log(f"{mac} BLE error: {e}", "ERROR")
+            session.reset()
+            await asyncio.sleep(self.reconnect_delay)
+
+    async def _run_passive_device(self, device):
+        """Waits for results that _scan() feeds into this scale's session."""
+        session, flow = self._new_session(device)
+        flow.set_state(STREAMING)
+        while await flow.wait_done():
+            self._finish(device, session)
+            session.reset(hold_weight=session.stable_weight)
+            flow.reset()
+            flow.set_state(STREAMING)
+
+    async def _scan(self):
+        """One scan for every passive scale; restarted after adapter errors."""
+        reader = AdvertisementWeightReader(self.sessions, company_id=self.company_id)
+        while True:
+            try:
+                scanner = StreamingScanner(on_advertisement=reader.handle_advertisement,
+                                           scanner_factory=self.scanner_factory)
+                await scanner.run(timeout=None, stop_on_match=False)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.log(f"BLE scan error: {e}", "ERROR")
+            await asyncio.sleep(self.reconnect_delay)
+
+    def _finish(self, device, session):
+        mac = device['mac_address'].upper()
+        self.counts[mac] = self.counts.get(mac, 0) + 1
+        self.log(f"{mac} measurement #{self.counts[mac]}: {session.stable_weight:.2f} kg")
+        if self.history:
+            try:
+                session.history_id = self.history.record(session.stable_weight, mac=mac, composition=session.analysis,
+                                                         ffb3_packet=session.stable_ffb3_packet)
+            except Exception as e:
+                self.log(f"{mac} measurement history error: {e}", "ERROR")
+        try:
+            self.on_measurement(device, session)
+        except Exception as e:
+            self.log(f"{mac} measurement handler error: {e}", "ERROR")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure several FiToGar scales concurrently.")
+    parser.add_argument('--ini', default=None, help="waga.ini path (default: config/waga.ini)")
+    parser.add_argument('--simulate', metavar='CAPTURE', help="replay a ble_*.log capture instead of Bluetooth")
+    parser.add_argument('-n', '--devices', type=int, default=3, help="number of simulated scales")
+    parser.add_argument('--interval', type=float, default=0.01, help="simulated packet interval in seconds")
+    parser.add_argument('--duration', type=float, default=None, help="stop after N seconds")
+    parser.add_argument('--weight-only', action='store_true', help="finish on a stable weight, without FFB3 composition")
+    parser.add_argument('--passive', action='store_true', help="read weight from advertisements instead of connecting")
+    parser.add_argument('--no-upload', action='store_true', help="print results instead of queueing uploads (history is still recorded)")
+    args = parser.parse_args(argv)
+
+    from app_config import get_config
+    config = get_config(args.ini)
+    log = lambda message, level="INFO": print(f"[{level}] {message}")
+
+    if args.simulate and args.passive:
+        print("--simulate replays GATT notifications and cannot be combined with --passive.")
+        return 1
+    if args.simulate:
+        devices = [{'mac_address': f"00:00:00:00:00:{i:02X}", 'name': f"SIM_{i}"} for i in range(args.devices)]
+        backend = simulated_backend(args.simulate, interval=args.interval)
+    else:
+        devices = config.devices
+        backend = bleak_backend
+    if not devices:
+        print("No scales configured ([URZADZENIE] sections with mac_address).")
+        return 1
+
+    from measurement_history import get_measurement_history
+    history = get_measurement_history(config.ini_path, log=log)
+    if args.no_upload:
+        sink = lambda device, session: print(f"{device.get('name') or device['mac_address']}: {session.stable_weight:.2f} kg")
+    else:
+        sink = upload_sink(config.ini_path, log=log, history=history)
+
+    manager = ScaleManager(devices, sink, backend=backend, require_composition=not args.weight_only,
+                           history=history, log=log, passive=args.passive, adv_offset=config.adv_offset,
+                           min_stable=config.adv_min_stable if args.passive else MIN_STABLE_COUNT)
+    try:
+        asyncio.run(manager.run(args.duration))
+    except KeyboardInterrupt:
+        pass
+    print(f"Measurements: {manager.counts}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
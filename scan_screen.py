@@ -1,22 +1,27 @@
 import asyncio
-import configparser
 from pathlib import Path
 
 from kivy.uix.screenmanager import Screen
 from kivy.uix.boxlayout import BoxLayout
 from kivy.uix.label import Label
 from kivy.uix.button import Button
-from kivy.uix.gridlayout import GridLayout
-from kivy.uix.scrollview import ScrollView
 from kivy.uix.progressbar import ProgressBar
+from kivy.uix.textinput import TextInput
+from kivy.uix.togglebutton import ToggleButton
+from kivy.uix.recycleview import RecycleView
+from kivy.uix.recycleview.views import RecycleDataViewBehavior
+from kivy.uix.recycleboxlayout import RecycleBoxLayout
 from kivy.graphics import Color, Rectangle
-from kivy.properties import StringProperty, ListProperty, NumericProperty
-from kivy.clock import mainthread
-
-from bleak import BleakScanner, BleakClient
+from kivy.properties import StringProperty, ListProperty, NumericProperty, BooleanProperty
 
 try:
     import dekodery
+    from app_config import get_config
+    from gatt_reader import read_device_info
+    from device_profiles import get_device_profiles
+    from ble_scanner import StreamingScanner, ScanResults
+    from ui_components import CoalescingUpdater
+    import asset_cache
 except ImportError as e:
     print(f"Błąd krytyczny: {e}")
     exit()
@@ -24,24 +29,6 @@ except ImportError as e:
 CURRENT_DIR = Path(__file__).parent
 INI_PATH = CURRENT_DIR / "config" / "waga.ini"
 
-DIS_CHARACTERISTICS = {
-    "00002a29-0000-1000-8000-00805f9b34fb": "manufacturer",
-    "00002a24-0000-1000-8000-00805f9b34fb": "model",
-    "00002a25-0000-1000-8000-00805f9b34fb": "serial_number",
-    "00002a27-0000-1000-8000-00805f9b34fb": "hardware_rev",
-    "00002a26-0000-1000-8000-00805f9b34fb": "firmware_rev",
-    "00002a28-0000-1000-8000-00805f9b34fb": "software_rev",
-    "00002a23-0000-1000-8000-00805f9b34fb": "system_id",
-}
-
-GAS_CHARACTERISTICS = {
-    "00002a00-0000-1000-8000-00805f9b34fb": "device_name",
-    "00002a01-0000-1000-8000-00805f9b34fb": "appearance",
-    "00002a04-0000-1000-8000-00805f9b34fb": "ppcp",
-    "00002aa6-0000-1000-8000-00805f9b34fb": "car",
-    "00002ac9-0000-1000-8000-00805f9b34fb": "rpa_only",
-}
-
 def ble_parse_special_fields(key, value):
     if key == "system_id":
         try:
@@ -56,6 +43,50 @@ def ble_parse_special_fields(key, value):
             return str(value)
     return value.decode('utf-8', errors='ignore').strip() if isinstance(value, (bytes, bytearray)) else str(value)
 
+ROW_COLOR = (0.1, 0.4, 0.6, 1)
+SELECTED_ROW_COLOR = (0.3, 0.7, 0.3, 1)
+SORT_LABELS = {'rssi': "Sort: signal", 'name': "Sort: name"}
+
+class DeviceRow(RecycleDataViewBehavior, Button):
+    """One device in the scan list; the RecycleView reuses rows and only swaps their data."""
+    address = StringProperty('')
+    selected = BooleanProperty(False)
+
+    def __init__(self, **kwargs):
+        super().__init__(background_normal='', background_color=ROW_COLOR, **kwargs)
+        self.list_view = None
+
+    def refresh_view_attrs(self, rv, index, data):
+        self.list_view = rv
+        return super().refresh_view_attrs(rv, index, data)
+
+    def on_selected(self, _, selected):
+        self.background_color = SELECTED_ROW_COLOR if selected else ROW_COLOR
+
+    def on_release(self):
+        if self.list_view and self.list_view.on_row_selected:
+            self.list_view.on_row_selected(self.address)
+
+class DeviceListView(RecycleView):
+    """Virtualized device list: only the rows on screen exist as widgets."""
+    def __init__(self, on_row_selected=None, **kwargs):
+        super().__init__(**kwargs)
+        self.on_row_selected = on_row_selected
+        self.viewclass = DeviceRow
+        layout = RecycleBoxLayout(orientation='vertical', spacing=5, size_hint_y=None,
+                                  default_size=(None, 60), default_size_hint=(1, None))
+        layout.bind(minimum_height=layout.setter('height'))
+        self.add_widget(layout)
+
+    def set_rows(self, rows):
+        """Updates changed rows in place when the order is unchanged, otherwise replaces the data."""
+        if [r['address'] for r in rows] != [r['address'] for r in self.data]:
+            self.data = rows
+            return
+        for i, row in enumerate(rows):
+            if row != self.data[i]:
+                self.data[i] = row
+
 class ScanScreen(Screen):
     status_text = StringProperty("Press 'Scan' to start.")
     selected_device_info = StringProperty("No device selected.")
@@ -69,8 +100,10 @@ class ScanScreen(Screen):
         self.scan_task = None
         self.read_task = None
         self.selected_device = None
-        self.config = configparser.ConfigParser()
-        self.last_selected_button = None
+        self.scanner = None
+        self.results = ScanResults()
+        self.results_revision = 0
+        self.list_updater = CoalescingUpdater(self.refresh_device_list)
         self.build_ui()
         
     def on_back_pressed(self, _):
@@ -84,20 +117,18 @@ class ScanScreen(Screen):
         self.selected_device_info = "No device selected."
         self.status_text = "Press 'Scan' to start."
         self.found_devices = []
-        self.devices_grid.clear_widgets()
+        self.results.clear()
+        self.device_list.data = []
         self.progress.opacity = 0
         self.progress_value = 0
-        self.save_button.disabled = True
-        if self.last_selected_button:
-            self.last_selected_button.background_color = (0.1, 0.4, 0.6, 1)
-            self.last_selected_button = None
+        self.save_button.disabled = self.add_button.disabled = True
         if self.manager:
             self.manager.current = 'start'
 
 
     def build_ui(self):
         with self.canvas.before:
-            self.bg = Rectangle(source="assets/images/tlo3a.png", pos=self.pos, size=self.size)
+            self.bg = Rectangle(texture=asset_cache.background('tlo3a.png'), pos=self.pos, size=self.size)
 
         root = BoxLayout(orientation='vertical', spacing=10, padding=15)
 
@@ -122,15 +153,24 @@ class ScanScreen(Screen):
         self.device_box.add_widget(self.progress)
         root.add_widget(self.device_box)
 
-        self.scroll = ScrollView(size_hint_y=0.7)
+        filter_box = BoxLayout(size_hint_y=None, height=40, spacing=10)
+        self.filter_input = TextInput(hint_text="Filter by name or MAC", multiline=False)
+        self.filter_input.bind(text=self.on_filter_text)
+        self.sort_button = Button(text=SORT_LABELS[self.results.sort_by], size_hint_x=0.3,
+                                  background_color=(0.1, 0.5, 0.8, 1), background_normal='')
+        self.sort_button.bind(on_press=self.toggle_sort)
+        self.ffb0_button = ToggleButton(text="FFB0 only", size_hint_x=0.25)
+        self.ffb0_button.bind(state=self.on_ffb0_filter)
+        filter_box.add_widget(self.filter_input)
+        filter_box.add_widget(self.sort_button)
+        filter_box.add_widget(self.ffb0_button)
+        root.add_widget(filter_box)
+
+        self.scroll = self.device_list = DeviceListView(on_row_selected=self.select_device, size_hint_y=0.65)
         with self.scroll.canvas.before:
             Color(1, 1, 1, 0.2)
             self.scroll_rect = Rectangle()
         self.scroll.bind(pos=self.update_scroll_rect, size=self.update_scroll_rect)
-
-        self.devices_grid = GridLayout(cols=1, spacing=5, size_hint_y=None)
-        self.devices_grid.bind(minimum_height=self.devices_grid.setter('height'))
-        self.scroll.add_widget(self.devices_grid)
         root.add_widget(self.scroll)
 
         self.buttons_box = BoxLayout(size_hint_y=0.1, spacing=15, padding=[10, 10])
@@ -144,17 +184,21 @@ class ScanScreen(Screen):
         self.save_button = Button(text="Save parameters", disabled=True, background_color=(0.1, 0.5, 0.8, 1), background_normal='')
         self.save_button.bind(on_press=self.save_selected_device)
 
+        # Registers the device as one more scale ([URZADZENIE_<n>]) instead of replacing [URZADZENIE]
+        self.add_button = Button(text="Add as new scale", disabled=True, background_color=(0.1, 0.5, 0.8, 1), background_normal='')
+        self.add_button.bind(on_press=lambda button: self.save_selected_device(button, as_new=True))
+
         self.back_button = Button(text="Back", background_color=(0.8, 0.2, 0.2, 1), background_normal='')
         self.back_button.bind(on_press=self.on_back_pressed)
 
         self.buttons_box.add_widget(self.scan_button)
         self.buttons_box.add_widget(self.save_button)
+        self.buttons_box.add_widget(self.add_button)
         self.buttons_box.add_widget(self.back_button)
         root.add_widget(self.buttons_box)
 
         self.add_widget(root)
         self.bind(pos=self.update_rects, size=self.update_rects)
-        self.bind(found_devices=self.update_device_list)
 
     def update_rects(self, *args):
         self.bg.pos = self.pos
@@ -180,48 +224,81 @@ class ScanScreen(Screen):
         else:
             self.status_text = "Scanning BLE..."
             self.found_devices = []
+            self.results.clear()
+            self.list_changed()
             self.scan_button.text = "Stop"
             self.scan_task = asyncio.create_task(self.perform_scan())
 
     async def perform_scan(self):
         try:
-            devices = await BleakScanner.discover(timeout=15)
-            self.found_devices = [d for d in devices if d.address]
+            # Devices show up as their advertisements arrive instead of after the whole scan
+            self.scanner = StreamingScanner(on_advertisement=self.on_advertisement)
+            await self.scanner.run(timeout=15, stop_on_match=False)
             self.status_text = f"Found {len(self.found_devices)} devices." if self.found_devices else "No BLE devices found."
         except Exception as e:
             self.status_text = f"Scan error: {e}"
         finally:
             self.scan_button.text = "Scan"
 
-    @mainthread
-    def update_device_list(self, _, devices):
-        self.devices_grid.clear_widgets()
-        for dev in devices:
-            b = Button(text=f"{dev.name or 'No name'}\n{dev.address}", size_hint_y=None, height=60,
-                       background_color=(0.1, 0.4, 0.6, 1), background_normal='')
-            b.bind(on_press=lambda btn, d=dev: self.select_device(d, btn))
-            self.devices_grid.add_widget(b)
-
-    def select_device(self, device, btn):
+    def on_advertisement(self, device, adv):
+        is_new = (device.address or '').upper() not in self.results.entries
+        rssi = self.scanner.rssi.get((device.address or '').upper())
+        changed = self.results.update(device, rssi, getattr(adv, 'service_uuids', None))
+        if is_new:
+            self.found_devices.append(device)
+            self.status_text = f"Scanning BLE... {len(self.found_devices)} found"
+        if changed:
+            self.list_changed()
+
+    def list_changed(self):
+        # Hundreds of advertisers would otherwise mean a list refresh per advertisement
+        self.results_revision += 1
+        self.list_updater.submit(self.results_revision)
+
+    def refresh_device_list(self, _revision=None):
+        selected = self.selected_device.address if self.selected_device else None
+        rows = []
+        for entry in self.results.visible():
+            signal = f"  ({entry['rssi']} dBm)" if entry['rssi'] is not None else ""
+            service = "  FFB0" if entry['ffb0'] else ""
+            rows.append({'address': entry['address'],
+                         'text': f"{entry['name'] or 'No name'}\n{entry['address']}{signal}{service}",
+                         'selected': entry['address'] == selected})
+        self.device_list.set_rows(rows)
+
+    def on_filter_text(self, _, text):
+        self.results.text_filter = text
+        self.list_changed()
+
+    def on_ffb0_filter(self, _, state):
+        self.results.ffb0_only = state == 'down'
+        self.list_changed()
+
+    def toggle_sort(self, _):
+        self.sort_button.text = SORT_LABELS[self.results.next_sort()]
+        self.list_changed()
+
+    def select_device(self, address):
+        entry = self.results.entries.get(address.upper())
+        if entry is None:
+            return
+        device = entry['device']
         self.selected_device = device
         self.selected_device_info = f"Name: {device.name or 'None'}\nAddress: {device.address}"
-        self.save_button.disabled = False
-        if self.last_selected_button:
-            self.last_selected_button.background_color = (0.1, 0.4, 0.6, 1)
-        self.last_selected_button = btn
-        btn.background_color = (0.3, 0.7, 0.3, 1)
-
-    def save_selected_device(self, _):
-        self.save_button.disabled = True
+        self.save_button.disabled = self.add_button.disabled = False
+        self.list_changed()
+
+    def save_selected_device(self, _, as_new=False):
+        self.save_button.disabled = self.add_button.disabled = True
         self.progress.opacity = 1
         self.status_text = "Reading details..."
-        self.read_task = asyncio.create_task(self.read_and_save())
+        self.read_task = asyncio.create_task(self.read_and_save(as_new))
 
-    async def read_and_save(self):
+    async def read_and_save(self, as_new=False):
         try:
             from bleak import BleakClient
             dekodery.loguj(f"🟡 Attempting to connect to {self.selected_device.address}", ini_path=str(INI_PATH))
-            client = BleakClient(self.selected_device.address)
+            client = BleakClient(self.selected_device)
 
             connected = await client.connect()
             if not connected:
@@ -237,68 +314,12 @@ class ScanScreen(Screen):
                 dekodery.loguj("⚠️ No services after connect()", ini_path=str(INI_PATH))
                 return
 
-            self.config.read(INI_PATH, encoding='utf-8')
             info = {"mac_address": self.selected_device.address, "name": self.selected_device.name}
-            log_attempts = []
-
-            for uuid_map, zbior in [(GAS_CHARACTERISTICS, "GAS"), (DIS_CHARACTERISTICS, "DIS")]:
-                for uuid, key in uuid_map.items():
-                    char_list = [
-                        char
-                        for svc in client.services
-                        for char in svc.characteristics
-                        if char.uuid == uuid
-                    ]
-                    if not char_list:
-                        info[key] = "---"
-                        log_attempts.append(f"[{zbior}] {key} ({uuid}): no characteristics.")
-                        continue
-
-                    for i, char in enumerate(char_list):
-                        log_attempts.append(f"[{zbior}] {key} | char#{i+1} | handle={char.handle} | props={char.properties}")
-
-                    char = next((c for c in char_list if 'read' in c.properties), None)
-                    if char:
-                        try:
-                            val = await client.read_gatt_char(char)
-                            try:
-                                decoded = val.decode("utf-8", errors="replace").strip("\x00")
-                                if key == "system_id" and len(val) >= 6:
-                                    parts = [f"{b:02X}" for b in val]
-                                    system_id_fmt = ":".join(parts)
-                                    info[key] = system_id_fmt
-                                elif key == "ppcp" and len(val) == 8:
-                                    min_int = int.from_bytes(val[0:2], 'little') * 1.25
-                                    max_int = int.from_bytes(val[2:4], 'little') * 1.25
-                                    latency = int.from_bytes(val[4:6], 'little')
-                                    timeout = int.from_bytes(val[6:8], 'little') * 10
-                                    info[key] = f"min={min_int:.1f}ms, max={max_int:.1f}ms, latency={latency}, timeout={timeout}ms"
-                                elif key == "car" and len(val) == 1:
-                                    info[key] = "enabled" if val[0] == 1 else "disabled"
-                                else:
-                                    info[key] = decoded
-
-                                log_attempts.append(f"✔️ Read {key}: {decoded}")
-                            except:
-                                info[key] = val.hex()
-                                log_attempts.append(f"✔️ Read {key}: {val.hex()} (hex fallback)")
-                        except Exception as e:
-                            info[key] = "---"
-                            log_attempts.append(f"❌ Read error {key}: {e}")
-                    elif any('notify' in c.properties for c in char_list):
-                        info[key] = "[notify only]"
-                        log_attempts.append(f"ℹ️ {key}: notify only — skip read.")
-                    else:
-                        info[key] = "---"
-                        log_attempts.append(f"⚠️ {key}: no 'read'/'notify'.")
-
-            if 'URZADZENIE' not in self.config:
-                self.config['URZADZENIE'] = {}
-            for k, v in info.items():
-                self.config['URZADZENIE'][k] = str(v)
-
-            # 🆕 Dodaj sekcję [USŁUGI] z charakterystykami
-            self.config['USŁUGI'] = {}
+            odczyt, log_attempts = await read_device_info(client, services)
+            info.update(odczyt)
+
+            # 🆕 Struktura usług [USŁUGI] trafia do osobnego pliku gatt_cache.ini
+            uslugi = {}
             for svc in services:
                 uuid_uslugi = str(svc.uuid)
                 linie = []
@@ -307,7 +328,7 @@ class ScanScreen(Screen):
                     linie.append(f"{char.uuid} [{props}]")
                 multiline = "\n    ".join(linie)  # każda linia zaczyna się od spacji
                 
-                self.config['USŁUGI'][uuid_uslugi] = f"\n    {multiline}"  # \n na początku wartości
+                uslugi[uuid_uslugi] = f"\n    {multiline}"  # \n na początku wartości
 
             lines = ["📦 BLE service structure:"]
             for svc in services:
@@ -318,18 +339,23 @@ class ScanScreen(Screen):
             dekodery.loguj("\n".join(lines), dopisek="ScanScreen", ini_path=str(INI_PATH))
             dekodery.loguj("📝 Read attempts details:\n" + "\n".join(log_attempts), dopisek="BLE_IO", ini_path=str(INI_PATH))
 
-            INI_PATH.parent.mkdir(parents=True, exist_ok=True)
-            with open(INI_PATH, 'w', encoding='utf-8') as f:
-                self.config.write(f)
+            config = get_config(INI_PATH)
+            if as_new:
+                section = config.add_device(info, remove_sections=('USŁUGI',))
+            else:
+                section = config.device_section_for(info["mac_address"])
+                config.update({section: info}, remove_sections=('USŁUGI',))
+            config.save_gatt_services(uslugi)
+            get_device_profiles(INI_PATH).put(self.selected_device.address, info.get("firmware_rev"), services)
 
-            self.status_text = "✅ Data saved to waga.ini and log"
+            self.status_text = f"✅ Data saved to waga.ini [{section}] and log"
 
         except Exception as e:
             self.status_text = f"❌ Error: {e}"
             dekodery.loguj(f"❌ General exception: {e}", ini_path=str(INI_PATH))
         finally:
             self.progress.opacity = 0
-            self.save_button.disabled = False
+            self.save_button.disabled = self.add_button.disabled = False
 
     def on_back_pressed(self, _):
         if self.scan_task:
@@ -342,12 +368,10 @@ class ScanScreen(Screen):
         self.selected_device_info = "No device selected."
         self.status_text = "Press 'Scan' to start."
         self.found_devices = []
-        self.devices_grid.clear_widgets()
+        self.results.clear()
+        self.device_list.data = []
         self.progress.opacity = 0
         self.progress_value = 0
-        self.save_button.disabled = True
-        if self.last_selected_button:
-            self.last_selected_button.background_color = (0.1, 0.4, 0.6, 1)
-            self.last_selected_button = None
+        self.save_button.disabled = self.add_button.disabled = True
         if self.manager:
             self.manager.current = 'start'
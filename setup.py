@@ -3,33 +3,32 @@ import sys
 from cx_Freeze import setup, Executable
 import os
 
-# Określenie ścieżki do plików
+# Pakiety do zamrożenia: lista statyczna plus to, co według build_profile.json (python build_profile.py)
+# aplikacja faktycznie importuje w sesji start -> ważenie -> wysyłka.
+PROFILE_PATH = "build_profile.json"
+PACKAGES = ["kivy", "bleak", "garminconnect", "requests"]
+# Ekrany ładowane przez importlib (main.SCREENS) - cx_Freeze ich nie wykryje sam
+INCLUDES = [
+    "start_screen", "config_screen", "scan_screen", "weigh_screen",
+    "measurement_service", "upload_queue", "garmin_session",
+]
+EXCLUDES = ["tkinter", "unittest", "xml", "pydoc", "doctest", "difflib", "pandas", "matplotlib", "numpy"]
+ZIP_EXCLUDE = []
+
+if os.path.exists(PROFILE_PATH):
+    import json
+    with open(PROFILE_PATH, "r", encoding="utf-8") as f:
+        profile = json.load(f)
+    recorded = {name.split(".")[0] for name in profile["modules"]}
+    PACKAGES = sorted(set(PACKAGES) | set(profile["build_packages"]))
+    INCLUDES = sorted(set(INCLUDES) | set(profile["includes"]))
+    EXCLUDES = [name for name in EXCLUDES if name not in recorded]
+    ZIP_EXCLUDE = profile["zip_exclude_packages"]
+
 build_exe_options = {
-    "packages": [
-        "kivy", 
-        "bleak", 
-        "garminconnect", 
-        "pandas", 
-        "matplotlib",
-        "asyncio",
-        "configparser",
-        "pathlib",
-        "threading",
-        "datetime",
-        "requests",
-        "json",
-        "uuid"
-    ],
-    "excludes": [
-        "tkinter",
-        "unittest",
-        "email",
-        "xml",
-        "pydoc",
-        "doctest",
-        "argparse",
-        "difflib"
-    ],
+    "packages": PACKAGES,
+    "includes": INCLUDES,
+    "excludes": EXCLUDES,
     "include_files": [
         ("assets/", "assets/"),
         ("config/", "config/"),
@@ -39,13 +38,27 @@ build_exe_options = {
         "scan_screen.py",
         "weigh_screen.py",
         "dekodery.py",
-        "ui_components.py"
+        "app_config.py",
+        "log_writer.py",
+        "garmin_session.py",
+        "upload_queue.py",
+        "packet_capture.py",
+        "measurement.py",
+        "gatt_reader.py",
+        "device_profiles.py",
+        "ble_scanner.py",
+        "advertisement.py",
+        "scale_manager.py",
+        "measurement_service.py",
+        "ui_components.py",
+        "asset_cache.py",
+        "measurement_history.py"
     ],
     "optimize": 2,
     "build_exe": "../build/exe.win-amd64-3.8",
     # Dodane opcje dla bezpieczeństwa ścieżek
     "zip_include_packages": ["*"],
-    "zip_exclude_packages": []
+    "zip_exclude_packages": ZIP_EXCLUDE
 }
 
 # Ustawienia dla Windows
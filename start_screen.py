@@ -11,6 +11,8 @@ from kivy.graphics import Color
 from kivy.graphics.boxshadow import BoxShadow
 from kivy.app import App
 
+import asset_cache
+
 BASE_DIR = Path(__file__).parent
 
 class StartScreen(Screen):
@@ -20,7 +22,7 @@ class StartScreen(Screen):
         root_layout = RelativeLayout()
         
         # Application background
-        bg_image = Image(source=str(BASE_DIR / 'assets' / 'images' / 'tlo4.png'), allow_stretch=True, keep_ratio=False)
+        bg_image = Image(texture=asset_cache.background('tlo4.png'), allow_stretch=True, keep_ratio=False)
         root_layout.add_widget(bg_image)
         # Content container
         content_layout = BoxLayout(orientation='vertical', padding=20, spacing=30, pos_hint={'center_x': 0.5, 'center_y': 0.5}, size_hint=(0.8, 0.8))
@@ -30,9 +32,9 @@ class StartScreen(Screen):
         content_layout.add_widget(title_bar)
         # Application title
         title_box = BoxLayout(orientation='vertical', size_hint_y=0.5)
-        logo_path = BASE_DIR / 'assets' / 'images' / '_logo3.png'
-        if logo_path.exists():
-            title_box.add_widget(Image(source=str(logo_path), size_hint_y=0.7))
+        logo = asset_cache.texture('_logo3.png')
+        if logo is not None:
+            title_box.add_widget(Image(texture=logo, size_hint_y=0.7))
             #title_box.add_widget(Label(text="FiToGar", font_size='48sp', bold=True, color=(1,1,1,1)))
         content_layout.add_widget(title_box)
         # Buttons container
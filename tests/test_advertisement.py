@@ -0,0 +1,110 @@
+"""
+Passive capture against tests/fixtures/adv_synthetic_ffb2.log. The fixture is synthetic: the
+FFB2 notifications of a recorded FG2305ULB session (src/app/data/log/ble_c57530bb360e_20250703_130826.log)
+relabelled as advertisement frames. No real advertisement has been captured yet, so the tests
+check the decoding path for a given offset, not where the scale puts the weight in its frames.
+"""
+import asyncio
+from pathlib import Path
+from types import SimpleNamespace
+
+import advertisement
+import dekodery
+from measurement import MeasurementSession
+from packet_capture import read_capture
+from scale_manager import ScaleManager
+
+FIXTURE = Path(__file__).parent / "fixtures" / "adv_synthetic_ffb2.log"
+STABLE_WEIGHT = 98.31
+
+def fixture_frames():
+    return [data for ts, label, data in read_capture(FIXTURE) if label == advertisement.ADV_LABEL]
+
+def as_advertisement(frame):
+    """AdvertisementData as bleak builds it from a frame: first two bytes = company id, little endian."""
+    return SimpleNamespace(manufacturer_data={int.from_bytes(frame[:2], 'little'): frame[2:]})
+
+def replay(frames, offset=0, min_stable=advertisement.ADV_MIN_STABLE):
+    session = MeasurementSession(min_stable)
+    session.adv_offset = offset
+    session.require_composition = False
+    for frame in frames:
+        for rebuilt in advertisement.manufacturer_frames(as_advertisement(frame)):
+            session.handle_adv_frame(rebuilt)
+    return session
+
+def test_manufacturer_frames_rebuild_the_transmitted_frame():
+    frames = fixture_frames()
+    assert len(frames) == 228
+    for frame in frames:
+        assert list(advertisement.manufacturer_frames(as_advertisement(frame))) == [frame]
+
+def test_manufacturer_frames_company_filter():
+    frame = fixture_frames()[0]
+    company_id = int.from_bytes(frame[:2], 'little')
+    adv = SimpleNamespace(manufacturer_data={company_id: frame[2:], 0x004C: b'\x02\x15'})
+    assert list(advertisement.manufacturer_frames(adv, company_id)) == [frame]
+    assert len(list(advertisement.manufacturer_frames(adv))) == 2
+    assert list(advertisement.manufacturer_frames(SimpleNamespace())) == []
+
+def test_weight_packet_offset():
+    frame = fixture_frames()[-1]
+    assert advertisement.weight_packet(frame) == frame
+    assert dekodery.StabilityTracker().push(advertisement.weight_packet(frame))[0] == STABLE_WEIGHT
+
+    prefixed = b'\xaa\xbb' + frame
+    assert advertisement.weight_packet(prefixed, 2) == frame
+    assert dekodery.StabilityTracker().push(advertisement.weight_packet(prefixed))[0] != STABLE_WEIGHT
+
+def test_weight_packet_too_short():
+    frame = fixture_frames()[0]
+    assert advertisement.weight_packet(frame[:dekodery.FFB2_LAYOUT.size - 1]) is None
+    assert advertisement.weight_packet(frame, offset=len(frame)) is None
+
+def test_stable_weight_from_advertisements():
+    session = replay(fixture_frames())
+    assert session.stable_weight == STABLE_WEIGHT
+    assert session.is_complete
+    assert session.ffb2_packets.total < 228  # stops decoding once stable
+
+def test_stable_weight_with_offset():
+    frames = [b'\xaa\xbb' + frame for frame in fixture_frames()]
+    assert replay(frames, offset=2).stable_weight == STABLE_WEIGHT
+    assert replay(frames, offset=0).stable_weight != STABLE_WEIGHT
+
+def test_changing_packet_counter_does_not_break_stability():
+    # Same weight with a new FFB2 packet counter (here also the company id) in every frame
+    frame = fixture_frames()[-1]
+    frames = [bytes([i, 0]) + frame[2:] for i in range(advertisement.ADV_MIN_STABLE)]
+    assert replay(frames).stable_weight == STABLE_WEIGHT
+    assert replay(frames[:-1]).stable_weight is None
+
+class FakeScanner:
+    """BleakScanner stand-in: replays the fixture as advertisements of every address in `addresses`."""
+    def __init__(self, addresses, detection_callback):
+        self.addresses = addresses
+        self.detection_callback = detection_callback
+        self._task = None
+
+    async def start(self):
+        self._task = asyncio.create_task(self._feed())
+
+    async def stop(self):
+        self._task.cancel()
+
+    async def _feed(self):
+        for frame in fixture_frames():
+            for address in self.addresses:
+                await asyncio.sleep(0.001)
+                self.detection_callback(SimpleNamespace(address=address), as_advertisement(frame))
+
+def test_scale_manager_passive_monitors_several_scales():
+    devices = [{'mac_address': 'aa:00:00:00:00:01'}, {'mac_address': 'AA:00:00:00:00:02'}]
+    addresses = ['AA:00:00:00:00:01', 'aa:00:00:00:00:02', 'BB:00:00:00:00:03']
+    results = []
+    manager = ScaleManager(devices, lambda device, session: results.append((device['mac_address'], session.stable_weight)),
+                           passive=True, min_stable=advertisement.ADV_MIN_STABLE,
+                           scanner_factory=lambda detection_callback: FakeScanner(addresses, detection_callback))
+    asyncio.run(manager.run(2.0))
+    assert sorted(results) == [('AA:00:00:00:00:02', STABLE_WEIGHT), ('aa:00:00:00:00:01', STABLE_WEIGHT)]
+    assert manager.counts == {'AA:00:00:00:00:01': 1, 'AA:00:00:00:00:02': 1}
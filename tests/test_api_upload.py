@@ -0,0 +1,65 @@
+"""API uploads against a local http.server stub (needs requests)."""
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import dekodery
+
+pytest.importorskip('requests')
+
+class StubApi(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, so connection reuse is visible
+    replies = []     # (status, headers) per request; 200 once they run out
+    requests = []    # (client port, payload) per request
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        StubApi.requests.append((self.client_address[1], json.loads(body)))
+        status, headers = StubApi.replies.pop(0) if StubApi.replies else (200, {})
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'{}')
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def api(tmp_path):
+    StubApi.replies, StubApi.requests = [], []
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubApi)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    ini_path = tmp_path / "config" / "waga.ini"
+    ini_path.parent.mkdir()
+    ini_path.write_text(
+        "[PROGRAM]\nnazwa_pliku_log = log.txt\n"
+        "[GARMIN]\ntryb_wysylki = api\ngarmin_email = a@b.c\napi_token = t\n"
+        f"api_url = http://127.0.0.1:{server.server_address[1]}/upload\n", encoding='utf-8')
+    dekodery._http_session = None  # fresh pool: no connection left over from another test
+    yield str(ini_path)
+    server.shutdown()
+    server.server_close()
+    dekodery.flush_logs()
+
+def entries(count):
+    return [{'weight': 80.0 + i, 'measured_at': f"2026-01-0{i + 1}T08:00:00"} for i in range(count)]
+
+def test_502_is_not_posted_again(api):
+    StubApi.replies = [(502, {})]
+    assert dekodery.send_measurements(entries(1), api) == [False]
+    assert len(StubApi.requests) == 1
+
+def test_503_with_retry_after_is_retried(api):
+    StubApi.replies = [(503, {'Retry-After': '0'})]
+    assert dekodery.send_measurements(entries(1), api) == [True]
+    assert len(StubApi.requests) == 2
+
+def test_batch_reuses_one_connection(api):
+    assert dekodery.send_measurements(entries(3), api) == [True, True, True]
+    assert [payload['weight_kg'] for port, payload in StubApi.requests] == [80.0, 81.0, 82.0]
+    assert len({port for port, payload in StubApi.requests}) == 1
@@ -0,0 +1,26 @@
+from app_config import AppConfig
+
+def new_config(tmp_path, text="[PROGRAM]\nnazwa_pliku_log = log.txt\n"):
+    ini_path = tmp_path / "config" / "waga.ini"
+    ini_path.parent.mkdir()
+    ini_path.write_text(text, encoding='utf-8')
+    return AppConfig(ini_path, check_interval=0)
+
+def test_add_device_registers_further_scales(tmp_path):
+    config = new_config(tmp_path)
+    assert config.add_device({'mac_address': 'AA:00:00:00:00:01', 'name': 'first'}) == 'URZADZENIE'
+    assert config.add_device({'mac_address': 'AA:00:00:00:00:02', 'name': 'second'}) == 'URZADZENIE_2'
+    assert config.add_device({'mac_address': 'AA:00:00:00:00:03'}) == 'URZADZENIE_3'
+    assert [(d['section'], d['mac_address']) for d in config.devices] == [
+        ('URZADZENIE', 'AA:00:00:00:00:01'), ('URZADZENIE_2', 'AA:00:00:00:00:02'), ('URZADZENIE_3', 'AA:00:00:00:00:03')]
+
+def test_add_device_updates_a_known_scale_in_place(tmp_path):
+    config = new_config(tmp_path, "[URZADZENIE]\nmac_address = AA:00:00:00:00:01\n"
+                                  "[URZADZENIE_2]\nmac_address = AA:00:00:00:00:02\n")
+    assert config.add_device({'mac_address': 'aa:00:00:00:00:02', 'name': 'renamed'}) == 'URZADZENIE_2'
+    assert config.section('URZADZENIE_2')['name'] == 'renamed'
+    assert len(config.devices) == 2
+
+def test_add_device_skips_sections_in_use(tmp_path):
+    config = new_config(tmp_path, "[URZADZENIE]\nmac_address = AA:00:00:00:00:01\n[URZADZENIE_2]\nname = no mac yet\n")
+    assert config.add_device({'mac_address': 'AA:00:00:00:00:03'}) == 'URZADZENIE_3'
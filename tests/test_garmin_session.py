@@ -0,0 +1,68 @@
+import json
+import sys
+import time
+from types import SimpleNamespace
+
+from garmin_session import GarminSession
+
+class AuthError(Exception):
+    pass
+
+class StubGarmin:
+    """Garmin stand-in: counts logins, accepts only the tokens it handed out."""
+    logins = []
+    valid_tokens = set()
+
+    def __init__(self, email, password):
+        self.email = email
+        self.expired = False
+        self.garth = SimpleNamespace(dumps=self.dumps, oauth2_token=None)
+
+    def login(self, tokens=None):
+        if tokens is not None and tokens not in StubGarmin.valid_tokens:
+            raise AuthError("unknown tokens")
+        StubGarmin.logins.append('tokens' if tokens else 'password')
+
+    def dumps(self):
+        tokens = f"tokens-{len(StubGarmin.logins)}"
+        StubGarmin.valid_tokens.add(tokens)
+        return tokens
+
+    def upload(self):
+        if self.expired:
+            raise AuthError("session expired")
+        return 'ok'
+
+def new_session(tmp_path):
+    StubGarmin.logins = []
+    return GarminSession(tmp_path / "garmin_tokens.json", client_factory=StubGarmin, auth_error=AuthError)
+
+def test_logs_in_once_and_reuses_the_client(tmp_path):
+    session = new_session(tmp_path)
+    first = session.get_client('a@b.c', 'pw')
+    assert session.call('a@b.c', 'pw', lambda client: client.upload()) == 'ok'
+    assert session.get_client('a@b.c', 'pw') is first
+    assert StubGarmin.logins == ['password']
+    stored = json.loads((tmp_path / "garmin_tokens.json").read_text())
+    assert stored['email'] == 'a@b.c' and stored['expires_at'] > time.time()
+
+def test_restores_stored_tokens_after_restart(tmp_path):
+    new_session(tmp_path).get_client('a@b.c', 'pw')
+    restarted = GarminSession(tmp_path / "garmin_tokens.json", client_factory=StubGarmin, auth_error=AuthError)
+    restarted.get_client('a@b.c', 'pw')
+    assert StubGarmin.logins == ['password', 'tokens']
+    # Tokens of another account are not used
+    GarminSession(tmp_path / "garmin_tokens.json", client_factory=StubGarmin,
+                  auth_error=AuthError).get_client('x@y.z', 'pw')
+    assert StubGarmin.logins == ['password', 'tokens', 'password']
+
+def test_logs_in_again_after_an_auth_failure(tmp_path):
+    session = new_session(tmp_path)
+    session.get_client('a@b.c', 'pw').expired = True
+    assert session.call('a@b.c', 'pw', lambda client: client.upload()) == 'ok'
+    assert StubGarmin.logins == ['password', 'password']
+
+def test_runs_without_garminconnect_installed(tmp_path, monkeypatch):
+    monkeypatch.setitem(sys.modules, 'garminconnect', None)
+    session = GarminSession(tmp_path / "garmin_tokens.json", client_factory=StubGarmin)
+    assert session.call('a@b.c', 'pw', lambda client: client.upload()) == 'ok'
@@ -0,0 +1,61 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+from gatt_reader import read_device_info, DIS_CHARACTERISTICS, GAS_CHARACTERISTICS
+
+MODEL_UUID = "00002a24-0000-1000-8000-00805f9b34fb"
+SERIAL_UUID = "00002a25-0000-1000-8000-00805f9b34fb"
+
+def char(uuid, handle, properties=('read',)):
+    return SimpleNamespace(uuid=uuid, handle=handle, properties=list(properties))
+
+class FakeClient:
+    """BleakClient stand-in: every read takes `delay` seconds, reads of `hanging` never answer."""
+    def __init__(self, values, delay=0.05, hanging=()):
+        chars = [char(uuid, handle) for handle, uuid in enumerate(values, start=1)]
+        self.services = [SimpleNamespace(uuid="0000180a-0000-1000-8000-00805f9b34fb", characteristics=chars)]
+        self.values = values
+        self.delay = delay
+        self.hanging = set(hanging)
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def read_gatt_char(self, characteristic):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(3600 if characteristic.uuid in self.hanging else self.delay)
+            return self.values[characteristic.uuid]
+        finally:
+            self.in_flight -= 1
+
+def all_values():
+    return {uuid: f"{key}-value".encode() for uuid, key in {**DIS_CHARACTERISTICS, **GAS_CHARACTERISTICS}.items()}
+
+def test_reads_run_concurrently_up_to_the_limit():
+    client = FakeClient(all_values())
+    started = time.perf_counter()
+    info, log = asyncio.run(read_device_info(client, concurrency=4))
+    elapsed = time.perf_counter() - started
+    assert client.max_in_flight == 4
+    assert info['model'] == 'model-value' and info['firmware_rev'] == 'firmware_rev-value'
+    # 12 reads of 50 ms, four at a time: about 150 ms instead of 600 ms
+    assert elapsed < 0.45
+
+def test_a_hanging_read_times_out_alone():
+    client = FakeClient(all_values(), hanging={MODEL_UUID})
+    info, log = asyncio.run(read_device_info(client, concurrency=4, timeout=0.2))
+    assert info['model'] == '---'
+    assert any('timeout after 0.2s' in line for line in log)
+    assert info['serial_number'] == 'serial_number-value'
+
+def test_missing_and_notify_only_characteristics():
+    values = {SERIAL_UUID: b'1234'}
+    client = FakeClient(values)
+    client.services[0].characteristics.append(char(MODEL_UUID, 99, properties=('notify',)))
+    info, log = asyncio.run(read_device_info(client))
+    assert info['serial_number'] == '1234'
+    assert info['model'] == '[notify only]'
+    assert info['manufacturer'] == '---'
+    assert len(info) == len(DIS_CHARACTERISTICS) + len(GAS_CHARACTERISTICS)
@@ -0,0 +1,49 @@
+import asyncio
+import time
+
+from measurement_history import MeasurementHistory
+from upload_queue import UploadQueue
+from scale_manager import ScaleManager, SimulatedClient
+from test_scale_manager import recorded_packets
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+def test_fast_worker_cannot_overtake_the_history_link(tmp_path):
+    history = MeasurementHistory(tmp_path / "history.sqlite")
+    queue = UploadQueue(tmp_path / "outbox.sqlite", lambda entries: [True] * len(entries))
+    queue.start()
+    try:
+        for i in range(20):
+            history.queue_upload(history.record(80.0 + i), queue, 80.0 + i)
+        assert wait_for(lambda: history.upload_audit()['counts'] == {'sent': 20})
+    finally:
+        queue.stop()
+    assert {m['upload_attempts'] for m in history.measurements()} == {1}
+
+def test_entries_the_sender_never_tried_stay_pending(tmp_path):
+    history = MeasurementHistory(tmp_path / "history.sqlite")
+    queue = UploadQueue(tmp_path / "outbox.sqlite", lambda entries: [False])
+    first, second = history.record(80.0), history.record(81.0)
+    history.queue_upload(first, queue, 80.0)
+    history.queue_upload(second, queue, 81.0)
+    history.apply_upload_results(queue.drain_once())
+    rows = {m['id']: m for m in history.measurements()}
+    assert (rows[first]['upload_status'], rows[first]['upload_attempts']) == ('retrying', 1)
+    assert (rows[second]['upload_status'], rows[second]['upload_attempts']) == ('pending', 0)
+
+def test_scale_manager_records_history_without_upload(tmp_path):
+    history = MeasurementHistory(tmp_path / "history.sqlite")
+    packets = recorded_packets()
+    backend = lambda device, disconnected_callback=None: SimulatedClient(
+        packets, interval=0.001, disconnected_callback=disconnected_callback)
+    ids = []
+    manager = ScaleManager([{'mac_address': '00:00:00:00:00:01'}], lambda device, session: ids.append(session.history_id),
+                           backend=backend, require_composition=False, history=history)
+    asyncio.run(manager.run(1.0))
+    rows = history.measurements()
+    assert [m['id'] for m in rows] == ids
+    assert [(m['weight'], m['mac'], m['upload_status']) for m in rows] == [(98.31, '00:00:00:00:00:01', 'local')]
@@ -0,0 +1,30 @@
+import asyncio
+from pathlib import Path
+
+from packet_capture import read_capture
+from scale_manager import ScaleManager, SimulatedClient
+
+CAPTURE = Path(__file__).resolve().parent.parent / "src" / "app" / "data" / "log" / "ble_c57530bb360e_20250703_130826.log"
+EMPTY = bytes(12)  # FFB2 frame of an empty platform (0.00 kg)
+
+def run_scale(packets, duration=1.5):
+    results = []
+    backend = lambda device, disconnected_callback=None: SimulatedClient(
+        packets, interval=0.001, disconnected_callback=disconnected_callback)
+    manager = ScaleManager([{'mac_address': '00:00:00:00:00:01'}], lambda device, session: results.append(session.stable_weight),
+                           backend=backend, require_composition=False)
+    asyncio.run(manager.run(duration))
+    return results
+
+def recorded_packets():
+    return [(label, data) for ts, label, data in read_capture(CAPTURE)]
+
+def test_person_staying_on_the_scale_is_measured_once():
+    packets = recorded_packets()
+    last_weight = [p for p in packets if p[0] == 'FFB2'][-1]
+    assert run_scale(packets + [last_weight] * 80) == [98.31]
+
+def test_next_measurement_after_step_off():
+    packets = recorded_packets()
+    weights = [p for p in packets if p[0] == 'FFB2']
+    assert run_scale(packets + [weights[-1]] * 80 + [('FFB2', EMPTY)] * 5 + weights) == [98.31, 98.31]
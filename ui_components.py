@@ -1,10 +1,14 @@
 import os
+import threading
 from pathlib import Path
+from kivy.clock import Clock
 from kivy.uix.boxlayout import BoxLayout
 from kivy.uix.image import Image
 from kivy.uix.label import Label
 from kivy.graphics import Color, RoundedRectangle
 
+import asset_cache
+
 BASE_DIR = Path(__file__).parent
 
 class SectionTitle(BoxLayout):
@@ -15,9 +19,9 @@ class SectionTitle(BoxLayout):
         self.size_hint_y = None
         self.height = 40
         self.spacing = 10
-        icon_path = BASE_DIR / 'assets' / 'images' / icon_source
-        if icon_path.exists():
-            self.add_widget(Image(source=str(icon_path), size_hint_x=None, width=24))
+        icon = asset_cache.texture(icon_source)
+        if icon is not None:
+            self.add_widget(Image(texture=icon, size_hint_x=None, width=24))
         self.add_widget(Label(text=text, font_size='18sp', bold=True, color=(1,1,1,1), halign='left', valign='middle'))
 
 class InfoCard(BoxLayout):
@@ -33,3 +37,57 @@ class InfoCard(BoxLayout):
     def update_rect(self, *args):
         self.rect.pos = self.pos
         self.rect.size = self.size
+
+class CoalescingUpdater:
+    """
+    Collapses high-rate updates into at most one UI call per frame.
+    submit(*args) can be called from any thread; only the newest arguments are kept and
+    apply(*args) runs on the Kivy main thread at the next frame. A frame whose
+    key(*args) equals the last applied one is skipped (nothing visible would change).
+    """
+    def __init__(self, apply, key=None):
+        self.apply = apply
+        self.key = key or (lambda *args: args)
+        self._lock = threading.Lock()
+        self._pending = None
+        self._last_key = None
+        self._trigger = Clock.create_trigger(self._flush, 0)
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.submitted = 0
+        self.applied = 0
+        self.coalesced = 0  # replaced by a newer update before the frame
+        self.skipped = 0    # same key as the previous redraw
+
+    def reset(self):
+        """Forgets the pending update and the last key (e.g. for a new measurement)."""
+        with self._lock:
+            self._pending = None
+            self._last_key = None
+        self.reset_stats()
+
+    def submit(self, *args):
+        with self._lock:
+            if self._pending is not None:
+                self.coalesced += 1
+            self._pending = args
+            self.submitted += 1
+        self._trigger()
+
+    def _flush(self, dt):
+        with self._lock:
+            args, self._pending = self._pending, None
+        if args is None:
+            return
+        key = self.key(*args)
+        if key == self._last_key:
+            self.skipped += 1
+            return
+        self._last_key = key
+        self.applied += 1
+        self.apply(*args)
+
+    def stats(self):
+        return {'submitted': self.submitted, 'applied': self.applied,
+                'coalesced': self.coalesced, 'skipped': self.skipped}
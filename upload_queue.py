@@ -0,0 +1,217 @@
+import datetime
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from app_config import no_log, shared_data_object, shared_data_objects
+
+QUEUE_FILE_NAME = 'upload_queue.sqlite'
+BASE_RETRY_DELAY = 30.0   # seconds; doubled after every failed attempt
+MAX_RETRY_DELAY = 3600.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    measured_at TEXT NOT NULL,
+    weight REAL NOT NULL,
+    composition TEXT,
+    ffb3_packet TEXT,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt REAL NOT NULL DEFAULT 0,
+    last_error TEXT,
+    sent_at TEXT
+);
+CREATE INDEX IF NOT EXISTS outbox_pending ON outbox (status, next_attempt);
+"""
+
+class UploadQueue:
+    """
+    Durable outbox for confirmed measurements, stored in SQLite under data/.
+    enqueue() only writes a row; a background worker drains due entries through
+    `sender(entries) -> [True/False, ...]` and retries failures with exponential backoff.
+    Listeners are called as listener(results, pending_count) after every drain,
+    where results is a list of (entry, ok); entries carry their updated attempt count.
+    """
+    def __init__(self, db_path, sender, base_delay=BASE_RETRY_DELAY, max_delay=MAX_RETRY_DELAY, log=None):
+        self.db_path = str(db_path)
+        self.sender = sender
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.log = log or no_log
+        self.listeners = []
+        self._callbacks = {}  # entry id -> on_result(entry, ok, pending_count)
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        os.makedirs(os.path.dirname(self.db_path) or '.', exist_ok=True)
+        self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        with self._lock, self._db:
+            self._db.executescript(SCHEMA)
+
+    def subscribe(self, listener):
+        self.listeners.append(listener)
+
+    def unsubscribe(self, listener):
+        if listener in self.listeners:
+            self.listeners.remove(listener)
+
+    def enqueue(self, weight, composition=None, ffb3_packet=None, measured_at=None, on_result=None, wake=True):
+        """
+        Records a confirmed measurement for upload and wakes the worker. Returns the entry id.
+        on_result(entry, ok, pending_count) is called once, from the worker, with the first upload
+        result of this entry; it is registered before the worker can see the entry. With wake=False
+        the caller can link the id elsewhere first and call wake() itself.
+        """
+        measured_at = measured_at or datetime.datetime.now().isoformat()
+        if isinstance(ffb3_packet, (bytes, bytearray)):
+            ffb3_packet = ffb3_packet.hex()
+        with self._lock, self._db:
+            cur = self._db.execute(
+                "INSERT INTO outbox (measured_at, weight, composition, ffb3_packet) VALUES (?, ?, ?, ?)",
+                (measured_at, float(weight), json.dumps(composition) if composition else None, ffb3_packet))
+            if on_result:
+                self._callbacks[cur.lastrowid] = on_result
+        self.log(f"Queued {weight:.2f} kg for upload (entry #{cur.lastrowid}).")
+        if wake:
+            self.wake()
+        return cur.lastrowid
+
+    def pending_count(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM outbox WHERE status = 'pending'").fetchone()[0]
+
+    def status(self):
+        """Summary for the UI: pending count, next retry time and last error."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT COUNT(*), MIN(next_attempt), MAX(attempts) FROM outbox WHERE status = 'pending'").fetchone()
+            last_error = self._db.execute(
+                "SELECT last_error FROM outbox WHERE status = 'pending' AND last_error IS NOT NULL "
+                "ORDER BY id DESC LIMIT 1").fetchone()
+        return {
+            'pending': row[0],
+            'next_attempt': row[1],
+            'max_attempts': row[2] or 0,
+            'last_error': last_error[0] if last_error else None,
+        }
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="UploadQueue", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5.0):
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def wake(self):
+        """Asks the worker to drain now (e.g. after enqueue or when the network came back)."""
+        self._wake.set()
+
+    def drain_once(self, now=None):
+        """
+        When any entry is due, uploads all pending entries in one batch (one authenticated session).
+        Returns a list of (entry, ok).
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            due = self._db.execute(
+                "SELECT 1 FROM outbox WHERE status = 'pending' AND next_attempt <= ? LIMIT 1", (now,)).fetchone()
+            if not due:
+                return []
+            rows = self._db.execute("SELECT * FROM outbox WHERE status = 'pending' ORDER BY id").fetchall()
+        entries = [self._entry(row) for row in rows]
+        try:
+            sent = list(self.sender(entries))
+            error = None
+        except Exception as e:
+            sent, error = [], str(e)
+            self.log(f"Upload batch error: {e}", "ERROR")
+
+        # The sender stops at the first failure; entries after it were never tried.
+        # An exception is charged to the first entry only.
+        tried = 1 if error else len(sent)
+        retry_at = now + self.base_delay
+        results = []
+        with self._lock, self._db:
+            for i, entry in enumerate(entries):
+                ok = not error and i < tried and bool(sent[i])
+                if ok:
+                    entry['attempts'] += 1
+                    self._db.execute("UPDATE outbox SET status = 'sent', sent_at = ?, attempts = ? WHERE id = ?",
+                                     (datetime.datetime.now().isoformat(), entry['attempts'], entry['id']))
+                elif i < tried:
+                    entry['attempts'] += 1
+                    delay = min(self.max_delay, self.base_delay * 2 ** (entry['attempts'] - 1))
+                    retry_at = now + delay
+                    self._db.execute("UPDATE outbox SET attempts = ?, next_attempt = ?, last_error = ? WHERE id = ?",
+                                     (entry['attempts'], retry_at, error or "upload failed", entry['id']))
+                else:
+                    # Not attempted: same attempt count, goes out with the next batch
+                    self._db.execute("UPDATE outbox SET next_attempt = ? WHERE id = ?", (retry_at, entry['id']))
+                results.append((entry, ok))
+        return results
+
+    def _entry(self, row):
+        entry = dict(row)
+        entry['composition'] = json.loads(row['composition']) if row['composition'] else None
+        return entry
+
+    def _next_due_in(self):
+        with self._lock:
+            row = self._db.execute("SELECT MIN(next_attempt) FROM outbox WHERE status = 'pending'").fetchone()
+        if row[0] is None:
+            return None
+        return max(0.0, row[0] - time.time())
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self._next_due_in())
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            try:
+                results = self.drain_once()
+            except Exception as e:
+                self.log(f"Upload queue error: {e}", "ERROR")
+                results = []
+            if results:
+                self._notify(results)
+
+    def _notify(self, results):
+        pending = self.pending_count()
+        for entry, ok in results:
+            with self._lock:
+                callback = self._callbacks.pop(entry['id'], None)
+            if callback:
+                try:
+                    callback(entry, ok, pending)
+                except Exception as e:
+                    self.log(f"Upload result callback error: {e}", "ERROR")
+        for listener in list(self.listeners):
+            try:
+                listener(results, pending)
+            except Exception as e:
+                self.log(f"Upload queue listener error: {e}", "ERROR")
+
+def get_upload_queue(ini_path, log=None):
+    """Returns the shared, started UploadQueue of the app that owns `ini_path`."""
+    import dekodery
+    queue = shared_data_object(ini_path, QUEUE_FILE_NAME, lambda path: UploadQueue(
+        path, lambda entries: dekodery.send_measurements(entries, str(ini_path)), log=log))
+    queue.start()
+    return queue
+
+def stop_upload_queues():
+    for queue in shared_data_objects(QUEUE_FILE_NAME):
+        queue.stop()
@@ -1,9 +1,6 @@
 import os
-import configparser
-import threading
 import time
 import datetime
-import asyncio
 from pathlib import Path
 
 from kivy.uix.screenmanager import Screen
@@ -25,8 +22,6 @@ from kivy.core.window import Window
 from kivy.graphics import Color, Line
 from kivy.uix.widget import Widget
 
-from bleak import BleakClient, BleakError
-
 def check_for_bom(path):
     try:
         with open(path, "rb") as f:
@@ -37,7 +32,12 @@ def check_for_bom(path):
 
 try:
     import dekodery
-    from ui_components import InfoCard, SectionTitle
+    from app_config import get_config
+    from measurement_service import MeasurementService
+    import upload_queue
+    import asset_cache
+    from measurement import MIN_STABLE_COUNT
+    from ui_components import InfoCard, SectionTitle, CoalescingUpdater
 except ImportError as e:
     print(f"CRITICAL ERROR: {e}. Make sure that 'dekodery.py' and 'ui_components.py' files exist.")
     exit()
@@ -45,9 +45,6 @@ except ImportError as e:
 BASE_DIR = Path(__file__).parent
 INI_PATH = BASE_DIR / "config" / "waga.ini"
 LOG_DIR = BASE_DIR / "src" / "app" / "data" / "log" 
-FFB2_WEIGHT_UUID = "0000ffb2-0000-1000-8000-00805f9b34fb"
-FFB3_BODY_COMP_UUID = "0000ffb3-0000-1000-8000-00805f9b34fb"
-MIN_STABLE_COUNT = 29
 
 class WeighScreen(Screen):
     """
@@ -93,24 +90,38 @@ class WeighScreen(Screen):
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        self.measurement_task = None
+        self.upload_queue = None
         self.popup = None
         self.final_weight_to_send = None
+        # BLE flow and decoding live in the headless MeasurementService; this screen only renders its events
+        self.service = MeasurementService(INI_PATH, log=self.log)
+        self.service.subscribe(self.on_service_event)
+        # FFB2 arrives at ~10 Hz or faster: redraw at most once per frame and only on visible changes
+        self.weight_updater = CoalescingUpdater(
+            self.update_weight_ui, key=lambda weight, counter, is_stable: (f"{weight:.2f}", counter, is_stable))
         self.reset_state()
         self.build_ui()
 
     def reset_state(self):
         """Resets the internal measurement state."""
-        self.ffb2_packets = []
-        self.ffb3_packets = []
-        self.stable_weight = None
-        self.stable_ffb3_packet = None
+        self.session.reset()
+
+    @property
+    def session(self):
+        return self.service.session
+
+    @property
+    def stable_weight(self):
+        return self.session.stable_weight
+
+    @property
+    def stable_ffb3_packet(self):
+        return self.session.stable_ffb3_packet
 
     def build_ui(self):
         # 1. Draw background directly in this screen's canvas.before
         with self.canvas.before:
-            self.bg_rect = Rectangle(source=str(BASE_DIR / 'assets' / 'images' / 'tlo3.png'),
-                                     pos=self.pos, size=self.size)
+            self.bg_rect = Rectangle(texture=asset_cache.background('tlo3.png'), pos=self.pos, size=self.size)
         self.bind(pos=self.update_bg_rect, size=self.update_bg_rect)
 
         # Pasek tytułowy tylko z wersją aplikacji (bez pawel.eu)
@@ -421,30 +432,20 @@ class WeighScreen(Screen):
     def log(self, message, level="INFO"):
         dekodery.loguj(message, dopisek=f"WeighScreen [{level}]", ini_path=str(INI_PATH))
         
-    def log_packet(self, label, hex_data):
-        try:
-            with open(self.session_log_path, 'a', encoding='utf-8') as f:
-                f.write(f"[{label}] {hex_data}\n")
-        except Exception as e:
-            self.log(f"BLE packet write error: {e}", "ERROR")
-
-
     import datetime
 
     def load_config(self):
-        if not INI_PATH.exists():
+        config = get_config(INI_PATH)
+        if not config.exists:
             self.status_text = "❌ Error: waga.ini file not found"
             self.config_data = {}
             return
 
         LOG_DIR.mkdir(parents=True, exist_ok=True)
 
-        # 📥 Loading data from the file
-        parser = configparser.ConfigParser()
-        parser.read(INI_PATH, encoding='utf-8')
-
-        if 'URZADZENIE' in parser and parser.get('URZADZENIE', 'mac_address', fallback=''):
-            self.config_data = dict(parser['URZADZENIE'])
+        # 📥 Loading data from the shared config
+        if config.mac_address:
+            self.config_data = config.device
             self.log("✅ Scale configuration loaded.")
             print(f"📋 DEVICE: {self.config_data}")
 
@@ -453,129 +454,89 @@ class WeighScreen(Screen):
                 self.log("⚠️ INI file contains BOM – may cause errors!")
                 self.status_text = "⚠️ BOM detected in INI file"
 
-            # 🧾 Create BLE log path based on MAC
-            mac_raw = self.config_data.get('mac_address', 'unknown')
-            mac_clean = mac_raw.replace(":", "").lower()
-            timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-            log_filename = f"ble_{mac_clean}_{timestamp}.log"
-            self.session_log_path = LOG_DIR / log_filename
-            self.log(f"📁 Current BLE log: {self.session_log_path}")
-
         else:
             self.status_text = "❌ Error: MAC address missing in INI file"
             self.config_data = {}
     def toggle_measurement(self, instance):
-        is_running = self.measurement_task and not self.measurement_task.done()
-        if is_running: self.stop_measurement()
+        if self.service.is_running: self.stop_measurement()
         else: self.start_measurement()
     def start_measurement(self):
         if not self.config_data.get('mac_address'):
             self.status_text = "Error: Set MAC address!"; return
+        if not self.service.prepare():
+            return
+        self.stability_bar.max = self.session.min_stable
+        self.weight_updater.reset()
         self.reset_ui_full()
         self.status_text = "Starting measurement..."
         self.start_button.text = "Stop measurement"
-        self.measurement_task = asyncio.create_task(self.ble_measurement_logic())
-    async def ble_measurement_logic(self):
-        mac = self.config_data.get('mac_address')
-        self.log(f"Attempting to connect to {mac}...")
-        try:
-            async with BleakClient(mac, timeout=15.0) as client:
-                if client.is_connected:
-                    self.status_text = "Connected to scale."
-                    await client.start_notify(FFB2_WEIGHT_UUID, self.handle_ffb2_notification)
-                    await client.start_notify(FFB3_BODY_COMP_UUID, self.handle_ffb3_notification)
-                    
-                    # Added a short delay and changed the message
-                    await asyncio.sleep(1)
-                    self.status_text = "Measurement started"  # CHANGE 2
-                    
-                    while True: await asyncio.sleep(1)
-        except asyncio.CancelledError: self.log("Measurement task was cancelled.")
-        except Exception as e:
-            self.status_text = f"BLE error: {e}"; self.log(f"BLE error: {e}", "ERROR")
-        finally:
-            if self.measurement_task and not self.measurement_task.done(): self.stop_measurement()
+        self.service.start()
+
+    def on_service_event(self, event, data):
+        """Called by MeasurementService for every measurement event."""
+        if event == 'weight':
+            self.weight_updater.submit(*data)
+        elif event == 'status':
+            self.set_status(data)
+        elif event == 'stable':
+            self.on_weight_stable(data)
+        elif event == 'ffb3_packet':
+            self.update_ffb3_progress(data)
+        elif event == 'analysis':
+            self.display_final_analysis(*data)
+        elif event == 'complete':
+            self.check_if_measurement_complete()
+        elif event == 'state':
+            self.log(f"Measurement state: {data}")
+        elif event == 'finished':
+            self.stop_measurement(data)
 
     @mainthread
-    def stop_measurement(self):
-        if self.measurement_task:
-            self.measurement_task.cancel(); self.measurement_task = None
-        self.start_button.text = "Start measurement"
-        self.status_text = "Measurement stopped."
-
-    def handle_ffb2_notification(self, sender, data: bytearray):
-        if self.stable_weight is not None:
-            return
-        hex_data = data.hex()
-        self.ffb2_packets.append(hex_data)
-        self.log(f"[FFB2] Packet received: {hex_data}")
-        self.log_packet("FFB2", hex_data)
-        dekodery.find_fitogar_weight(
-            pakiety=self.ffb2_packets, 
-            min_stable=MIN_STABLE_COUNT,
-            on_update=self.update_weight_ui
-        )
+    def set_status(self, text):
+        self.status_text = text
 
+    @mainthread
+    def stop_measurement(self, status=None):
+        self.service.stop()
+        stats = self.weight_updater.stats()
+        if stats['submitted']:
+            self.log(f"Weight UI updates: {stats['submitted']} received, {stats['applied']} drawn, "
+                     f"{stats['coalesced']} coalesced, {stats['skipped']} unchanged")
+            self.weight_updater.reset_stats()
+        self.start_button.text = "Start measurement"
+        self.status_text = status or "Measurement stopped."
 
-    def handle_ffb3_notification(self, sender, data: bytearray):
-        hex_data = data.hex()
-        self.ffb3_packets.append(hex_data)
-        packet_num = len(self.ffb3_packets)
-        
-        self.log(f"[FFB3] Packet #{packet_num}: {hex_data}")
-        self.log_packet("FFB3", hex_data)
-        
-        # Update progress bar
+    @mainthread
+    def update_ffb3_progress(self, packet_num):
         self.ffb3_progress_bar.value = packet_num
         self.ffb3_progress_bar.opacity = 1
-        
-        # Analyze after receiving the 3rd packet
-        if packet_num == 3:
-            self.log(f"[FFB3] Decoding packet #{packet_num}")
-            self.stable_ffb3_packet = hex_data  # Use the current packet
-            self.display_final_analysis(self.stable_ffb3_packet)
-            
-        # Check after 5 packets (for compatibility)
-        if packet_num == 5:
-            if not self.stable_ffb3_packet:
-                self.stable_ffb3_packet = self.ffb3_packets[2]  # Use the 3rd packet (index 2)
-                self.display_final_analysis(self.stable_ffb3_packet)
-            self.check_if_measurement_complete()
 
-
-    @mainthread
     def update_weight_ui(self, weight, stability_counter, is_stable):
         self.weight_label.text = f"{weight:.2f}"
+        self.stability_bar.max = self.session.min_stable
         self.stability_bar.value = stability_counter
-        self.log(f"FFB2 packet: {self.ffb2_packets[-1]}, Weight: {weight}, Stability count: {stability_counter}/{MIN_STABLE_COUNT}, Stable: {is_stable}")
+        self.log(f"Weight: {weight}, Stability count: {stability_counter}/{self.session.min_stable}, Stable: {is_stable}")
 
         if weight == 0.0:
             self.weight_label.color = (1,1,1,1); self.stability_bar.opacity = 0
         elif is_stable:
             self.weight_label.color = (0.1,1,0.1,1); self.stability_bar.opacity = 0
-            if self.stable_weight is None:
-                self.status_text = "Weight stabilized"
-                self.log(f"Stable weight: {weight:.2f} kg"); self.stable_weight = weight
-                self.check_if_measurement_complete()
         else:
             self.weight_label.color = (1,0.6,0,1); self.stability_bar.opacity = 1
 
     @mainthread
-    def display_final_analysis(self, hex_packet):
-        self.log(f"Attempting to decode FFB3 packet: {hex_packet}")
-        
+    def on_weight_stable(self, weight):
+        self.status_text = "Weight stabilized"
+
+    @mainthread
+    def display_final_analysis(self, packet, results):
         # Update date and time of the measurement
         current_time = datetime.datetime.now().strftime("%d-%m-%Y\n%H:%M:%S")
         self.datetime_label.text = current_time
-        
-        # Actual decoding code
-        results = dekodery.dekoduj_ffb3(hex_packet)
-        if not results: 
-            self.log(f"FFB3 decoding error: {hex_packet}", "ERROR")
+
+        if not results:
             return
         
-        self.log(f"FFB3 data decoded: {results}")
-        
         # Assign values to labels
         for label_key, value_label in self.analysis_labels.items():
             if label_key in results:
@@ -590,7 +551,7 @@ class WeighScreen(Screen):
         self.analysis_grid.opacity = 1
 
     def check_if_measurement_complete(self):
-        if self.stable_weight is not None and self.stable_ffb3_packet is not None and not self.popup:
+        if self.session.is_complete and not self.popup:
             self.log("Measurement finished, showing popup."); self.show_confirmation_popup()
 
     @mainthread
@@ -658,21 +619,44 @@ class WeighScreen(Screen):
         
     def execute_garmin_send(self, weight):
         self.status_text = "Sending data to Garmin..."
-        threading.Thread(target=self.send_to_garmin_thread, args=(weight,), daemon=True).start()
-
-    def send_to_garmin_thread(self, weight):
-        success = dekodery.send_to_garmin(weight, INI_PATH, self.stable_ffb3_packet)
-        Clock.schedule_once(lambda dt: self.update_garmin_send_status(success), 0)
-        self.log(f"Send to Garmin: {'success' if success else 'error'}", "INFO" if success else "ERROR")
+        self.get_upload_queue()
+        # The result callback is registered before the upload worker can pick the entry up
+        self.service.upload(weight, on_result=self.on_own_upload_result)
+
+    def get_upload_queue(self):
+        """Returns the shared upload outbox, subscribing this screen on first use."""
+        if self.upload_queue is None:
+            self.upload_queue = upload_queue.get_upload_queue(INI_PATH, log=self.log)
+            self.upload_queue.subscribe(self.on_upload_results)
+        return self.upload_queue
+
+    def on_upload_results(self, results, pending):
+        """Called from the upload worker thread after every drain."""
+        for entry, ok in results:
+            self.log(f"Send to Garmin ({entry['weight']:.2f} kg, {entry['measured_at']}): {'success' if ok else 'error'}",
+                     "INFO" if ok else "ERROR")
+
+    def on_own_upload_result(self, entry, ok, pending):
+        """Result of the upload started on this screen (upload worker thread)."""
+        Clock.schedule_once(lambda dt: self.update_garmin_send_status(ok, pending), 0)
         Clock.schedule_once(lambda dt: self.reset_ui_full(), 3)
 
     @mainthread
-    def update_garmin_send_status(self, success):
+    def update_garmin_send_status(self, success, pending=0):
         self.status_text = "Weight sent to Garmin" if success else "Error while sending to Garmin."
+        if pending:
+            self.status_text += f" {self.pending_uploads_text(pending)}"
+
+    @staticmethod
+    def pending_uploads_text(pending):
+        return f"({pending} pending upload{'s' if pending != 1 else ''})"
 
     @mainthread
     def reset_ui_full(self):
         self.status_text = "Press 'Start measurement' to begin"
+        pending = self.get_upload_queue().pending_count()
+        if pending:
+            self.status_text += f" {self.pending_uploads_text(pending)}"
         self.start_button.text = "Start measurement"
         self.weight_label.text = "0.00"; self.weight_label.color = (1, 1, 1, 1)
         self.stability_bar.opacity = 0; self.stability_bar.value = 0